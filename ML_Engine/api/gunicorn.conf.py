@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for the ML Engine API
+
+Usage (from ML_Engine/api):
+    gunicorn -c gunicorn.conf.py server:app
+
+To split the models across processes, start one instance per role and
+route /api/ml/gnn/* and /api/ml/bert/* to them from the reverse proxy:
+    ML_API_ROLE=gnn  ML_API_PORT=5002 gunicorn -c gunicorn.conf.py server:app
+    ML_API_ROLE=bert ML_API_PORT=5003 gunicorn -c gunicorn.conf.py server:app
+"""
+
+import os
+
+# Make ML_Engine importable so the server can import `src` packages
+pythonpath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+bind = f"0.0.0.0:{os.environ.get('ML_API_PORT', 5001)}"
+
+# A single worker so the Torch models are loaded once per node.
+# Concurrency comes from the worker's asyncio event loop, not extra processes.
+workers = 1
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Allow slow first requests (model warm-up) without the arbiter killing the worker
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
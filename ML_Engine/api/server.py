@@ -1,55 +1,275 @@
 """
 ML Engine API Server
-Flask server for GNN inference
+Starlette (ASGI) server for GNN and BERT inference
+
+Run with a single process so each model is loaded exactly once (from ML_Engine):
+    uvicorn api.server:app --app-dir . --workers 1 --loop uvloop
+
+In production run it under Gunicorn (from ML_Engine/api, see gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py server:app
+
+Either way the launcher puts ML_Engine on the import path (--app-dir, or
+gunicorn's `pythonpath`) so `src` is importable; the module itself does
+not touch sys.path.
 """
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import sys
+import asyncio
+import collections
+import contextlib
+import functools
+import hashlib
+import json
 import os
+from typing import List
+
+from pydantic import BaseModel, ValidationError
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Which models this process serves: gnn, bert or both.
+# Run one process per role behind a reverse proxy to keep a single copy of each model per node.
+ML_API_ROLE = os.environ.get('ML_API_ROLE', 'both').lower()
+SERVE_GNN = ML_API_ROLE in ('gnn', 'both')
+SERVE_BERT = ML_API_ROLE in ('bert', 'both')
+
+
+# Model packages import torch, so they are only imported when first needed
+@functools.lru_cache(maxsize=1)
+def _gnn():
+    """GNN predictor, loaded on first use"""
+    from src.gnn.inference import get_predictor as get_gnn_predictor
+    return get_gnn_predictor()
+
+
+@functools.lru_cache(maxsize=1)
+def _bert():
+    """BERT predictor, loaded on first use"""
+    from src.bert.inference import get_predictor as get_bert_predictor
+    return get_bert_predictor()
+
+
+def _predict_gnn(scripts):
+    """GNN predictions for a list of scripts"""
+    return _gnn().predict_batch(scripts)
+
+
+def _predict_bert(scripts):
+    """BERT predictions, bypassing the predictor's result cache (server_loop keeps its own)"""
+    return _bert().predict_batch(scripts, use_cache=False)
+
+
+_PREDICTORS = {'gnn': _gnn, 'bert': _bert}
+_SERVED = {'gnn': SERVE_GNN, 'bert': SERVE_BERT}
+_LOAD_LOCKS = {'gnn': asyncio.Lock(), 'bert': asyncio.Lock()}
+
+
+def gnn_loaded() -> bool:
+    """Whether the GNN predictor has been loaded in this process"""
+    return _gnn.cache_info().currsize > 0
+
+
+def bert_loaded() -> bool:
+    """Whether the BERT predictor has been loaded in this process"""
+    return _bert.cache_info().currsize > 0
+
+
+def model_loaded() -> bool:
+    """Whether any predictor has been loaded in this process"""
+    return gnn_loaded() or bert_loaded()
+
 
-# Add parent directory to path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+async def _ensure_loaded(model: str) -> bool:
+    """
+    Load a served model on first use
+
+    Loading runs in a worker thread under a per-model lock, so the server
+    boots instantly and concurrent first requests load the model only once.
+    A failed load is retried on the next request.
+
+    Returns:
+        True if the predictor is available, False if disabled or loading failed
+    """
+    loader = _PREDICTORS[model]
+    if not _SERVED[model]:
+        return False
+    if loader.cache_info().currsize:
+        return True
 
-from src.gnn.inference import get_predictor as get_gnn_predictor
-from src.bert.inference import get_predictor as get_bert_predictor
+    async with _LOAD_LOCKS[model]:
+        try:
+            await asyncio.to_thread(loader)
+            return True
+        except Exception as e:
+            print(f"[ML API] Warning: {model.upper()} model loading failed: {e}")
+            print(f"[ML API] Train {model.upper()} model first: python src/{model}/train.py")
+            return False
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend
+# Micro-batching limits for the inference workers
+MAX_BATCH = int(os.environ.get('ML_API_MAX_BATCH', 32))
+MAX_WAIT_MS = float(os.environ.get('ML_API_MAX_WAIT_MS', 5))
 
-# Load GNN predictor on startup
-try:
-    gnn_predictor = get_gnn_predictor()
-    GNN_LOADED = True
-except Exception as e:
-    print(f"[ML API] Warning: GNN model loading failed: {e}")
-    print(f"[ML API] Train GNN model first: python src/gnn/train.py")
-    GNN_LOADED = False
+# Maximum number of cached predictions per model
+CACHE_SIZE = int(os.environ.get('ML_API_CACHE_SIZE', 10_000))
 
-# Load BERT predictor on startup
-try:
-    bert_predictor = get_bert_predictor()
-    BERT_LOADED = True
-except Exception as e:
-    print(f"[ML API] Warning: BERT model loading failed: {e}")
-    print(f"[ML API] Train BERT model first: python src/bert/train.py")
-    BERT_LOADED = False
 
-MODEL_LOADED = GNN_LOADED or BERT_LOADED
+def _cache_key(script_content):
+    """Content hash used to look up cached predictions (None if uncacheable)"""
+    if not isinstance(script_content, str):
+        return None
+    return hashlib.blake2b(script_content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
 
 
-@app.route('/health', methods=['GET'])
-def health():
+async def server_loop(q: asyncio.Queue, predict_batch, cache: collections.OrderedDict):
+    """
+    Inference worker that owns a predictor
+
+    Each queue item is the full list of scripts from one request. Requests
+    that arrive within MAX_WAIT_MS of each other are coalesced into one
+    predict_batch call (up to MAX_BATCH scripts, though a single bulk request
+    is never split). The forward pass runs in a worker thread, so the event
+    loop keeps accepting connections while the model is busy.
+
+    Results are memoized in an LRU keyed by the script's content hash. Only
+    this task and the event loop touch the cache, so no lock is needed.
+    This is the only result cache on the server path.
+
+    Args:
+        q: Queue of (scripts, response_q) tuples; each response_q receives one list of results
+        predict_batch: Predicts a list of scripts with the (already loaded) model
+        cache: LRU of content hash -> prediction result
+    """
+    while True:
+        batch = [await q.get()]
+        size = len(batch[0][0])
+
+        # Give concurrent callers a short window to join this batch
+        if q.empty():
+            await asyncio.sleep(MAX_WAIT_MS / 1000)
+        while size < MAX_BATCH and not q.empty():
+            batch.append(q.get_nowait())
+            size += len(batch[-1][0])
+
+        # Answer repeat scripts straight from the cache
+        results = [[None] * len(scripts) for scripts, _ in batch]
+        pending = []
+        for i, (scripts, _) in enumerate(batch):
+            for j, script_content in enumerate(scripts):
+                key = _cache_key(script_content)
+                if key is not None and key in cache:
+                    cache.move_to_end(key)
+                    results[i][j] = cache[key]
+                else:
+                    pending.append((key, i, j, script_content))
+
+        if pending:
+            scripts = [script_content for _, _, _, script_content in pending]
+            try:
+                predictions = await asyncio.to_thread(predict_batch, scripts)
+            except Exception as e:
+                predictions = [{'error': str(e)}] * len(pending)
+
+            for (key, i, j, _), result in zip(pending, predictions):
+                if key is not None and 'error' not in result:
+                    cache[key] = result
+                    if len(cache) > CACHE_SIZE:
+                        cache.popitem(last=False)
+                results[i][j] = result
+
+        for (_, response_q), request_results in zip(batch, results):
+            await response_q.put(request_results)
+
+
+async def _run_inference(queue: asyncio.Queue, scripts: List[str]) -> List[dict]:
+    """Submit one request's scripts to an inference worker and wait for their results"""
+    response_q = asyncio.Queue()
+    await queue.put((scripts, response_q))
+    return await response_q.get()
+
+
+class AnalyzeRequest(BaseModel):
+    """Request body for the single-script analysis endpoints"""
+    script_content: str
+
+
+class BulkAnalyzeRequest(BaseModel):
+    """Request body for the bulk analysis endpoints"""
+    scripts: List[str]
+
+
+class ResultJSONResponse(JSONResponse):
+    """JSONResponse for prediction results, which may hold NumPy arrays"""
+
+    def render(self, content) -> bytes:
+        # Imported here like the model packages: `src` is only importable once the launcher has set the path
+        from src.utils.serialization import NumpyEncoder
+
+        return json.dumps(
+            content,
+            cls=NumpyEncoder,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(',', ':'),
+        ).encode('utf-8')
+
+
+def _invalid_request(e: ValidationError) -> JSONResponse:
+    """400 response for a body that failed schema validation"""
+    return JSONResponse({
+        'error': 'Invalid request body',
+        'message': str(e)
+    }, status_code=400)
+
+
+def _model_unavailable(model: str) -> JSONResponse:
+    """503 response for a model that is not loaded in this process"""
+    served = SERVE_GNN if model == 'gnn' else SERVE_BERT
+    return JSONResponse({
+        'error': f'{model.upper()} model not loaded',
+        'message': (f'Train model first using: python src/{model}/train.py' if served
+                    else f'{model.upper()} is not served by this process (ML_API_ROLE={ML_API_ROLE})')
+    }, status_code=503)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Start one inference worker per served model (models load on first request)"""
+    workers = []
+
+    app.state.gnn_cache = collections.OrderedDict()
+    app.state.bert_cache = collections.OrderedDict()
+
+    if SERVE_GNN:
+        app.state.gnn_queue = asyncio.Queue()
+        workers.append(asyncio.create_task(
+            server_loop(app.state.gnn_queue, _predict_gnn, app.state.gnn_cache)
+        ))
+
+    if SERVE_BERT:
+        app.state.bert_queue = asyncio.Queue()
+        workers.append(asyncio.create_task(
+            server_loop(app.state.bert_queue, _predict_bert, app.state.bert_cache)
+        ))
+
+    yield
+
+    for worker in workers:
+        worker.cancel()
+
+
+async def health(request):
     """Health check endpoint"""
-    return jsonify({
+    return JSONResponse({
         'status': 'healthy',
         'service': 'ML Engine API',
-        'model_loaded': MODEL_LOADED
+        'model_loaded': model_loaded()
     })
 
 
-@app.route('/api/ml/gnn/analyze', methods=['POST'])
-def analyze_gnn():
+async def analyze_gnn(request):
     """
     GNN analysis endpoint
 
@@ -67,37 +287,72 @@ def analyze_gnn():
         "graph_metadata": {...}
     }
     """
-    if not GNN_LOADED:
-        return jsonify({
-            'error': 'GNN model not loaded',
-            'message': 'Train model first using: python src/gnn/train.py'
-        }), 503
+    if not await _ensure_loaded('gnn'):
+        return _model_unavailable('gnn')
 
     try:
-        data = request.get_json()
+        # Parse and validate the body in one pass
+        body = AnalyzeRequest.model_validate_json(await request.body())
+
+        # Run GNN prediction
+        result = (await _run_inference(request.app.state.gnn_queue, [body.script_content]))[0]
 
-        if not data or 'script_content' not in data:
-            return jsonify({'error': 'Missing script_content in request body'}), 400
+        if 'error' in result:
+            return ResultJSONResponse(result, status_code=500)
+
+        return ResultJSONResponse(result, status_code=200)
+
+    except ValidationError as e:
+        return _invalid_request(e)
 
-        script_content = data['script_content']
+    except Exception as e:
+        return JSONResponse({
+            'error': str(e),
+            'message': 'Internal server error during GNN analysis'
+        }, status_code=500)
+
+
+async def analyze_gnn_bulk(request):
+    """
+    Bulk GNN analysis endpoint
+
+    All scripts are handed to the GNN worker as a single queue item, so their
+    graphs are collated into batches and every GCN layer runs once per batch
+    instead of once per script.
+
+    Request body:
+    {
+        "scripts": ["#!/bin/bash\nwget ...", "#!/bin/bash\necho ..."]
+    }
+
+    Response:
+    [
+        {"is_malicious": true, "risk_score": 87.5, ...},
+        {"is_malicious": false, "risk_score": 3.1, ...}
+    ]
+    """
+    if not await _ensure_loaded('gnn'):
+        return _model_unavailable('gnn')
+
+    try:
+        body = BulkAnalyzeRequest.model_validate_json(await request.body())
 
         # Run GNN prediction
-        result = gnn_predictor.predict(script_content)
+        results = await _run_inference(request.app.state.gnn_queue, body.scripts)
 
-        if 'error' in result:
-            return jsonify(result), 500
+        return ResultJSONResponse(results, status_code=200)
 
-        return jsonify(result), 200
+    except ValidationError as e:
+        return _invalid_request(e)
 
     except Exception as e:
-        return jsonify({
+        return JSONResponse({
             'error': str(e),
             'message': 'Internal server error during GNN analysis'
-        }), 500
+        }, status_code=500)
 
 
-@app.route('/api/ml/bert/analyze', methods=['POST'])
-def analyze_bert():
+async def analyze_bert(request):
     """
     BERT analysis endpoint
 
@@ -116,46 +371,80 @@ def analyze_bert():
         "threat_indicators": [...]
     }
     """
-    if not BERT_LOADED:
-        return jsonify({
-            'error': 'BERT model not loaded',
-            'message': 'Train model first using: python src/bert/train.py'
-        }), 503
+    if not await _ensure_loaded('bert'):
+        return _model_unavailable('bert')
 
     try:
-        data = request.get_json()
+        # Parse and validate the body in one pass
+        body = AnalyzeRequest.model_validate_json(await request.body())
+
+        # Run BERT prediction
+        result = (await _run_inference(request.app.state.bert_queue, [body.script_content]))[0]
 
-        if not data or 'script_content' not in data:
-            return jsonify({'error': 'Missing script_content in request body'}), 400
+        if 'error' in result:
+            return ResultJSONResponse(result, status_code=500)
+
+        return ResultJSONResponse(result, status_code=200)
+
+    except ValidationError as e:
+        return _invalid_request(e)
 
-        script_content = data['script_content']
+    except Exception as e:
+        return JSONResponse({
+            'error': str(e),
+            'message': 'Internal server error during BERT analysis'
+        }, status_code=500)
+
+
+async def analyze_bert_bulk(request):
+    """
+    Bulk BERT analysis endpoint
+
+    All scripts are handed to the BERT worker as a single queue item and
+    tokenized into length-sorted, dynamically padded batches.
+
+    Request body:
+    {
+        "scripts": ["#!/bin/bash\nwget ...", "#!/bin/bash\necho ..."]
+    }
+
+    Response:
+    [
+        {"is_malicious": true, "risk_score": 85.2, ...},
+        {"is_malicious": false, "risk_score": 2.4, ...}
+    ]
+    """
+    if not await _ensure_loaded('bert'):
+        return _model_unavailable('bert')
+
+    try:
+        body = BulkAnalyzeRequest.model_validate_json(await request.body())
 
         # Run BERT prediction
-        result = bert_predictor.predict(script_content)
+        results = await _run_inference(request.app.state.bert_queue, body.scripts)
 
-        if 'error' in result:
-            return jsonify(result), 500
+        return ResultJSONResponse(results, status_code=200)
 
-        return jsonify(result), 200
+    except ValidationError as e:
+        return _invalid_request(e)
 
     except Exception as e:
-        return jsonify({
+        return JSONResponse({
             'error': str(e),
             'message': 'Internal server error during BERT analysis'
-        }), 500
+        }, status_code=500)
 
 
-@app.route('/api/ml/models/info', methods=['GET'])
-def models_info():
+async def models_info(request):
     """Get information about loaded models"""
     info = {
         'gnn': {
-            'status': 'loaded' if GNN_LOADED else 'not_loaded',
+            'status': 'loaded' if gnn_loaded() else ('not_loaded' if SERVE_GNN else 'disabled'),
             'model_path': '../../models/gnn/gnn_malware_detector.pth',
             'description': 'Graph Neural Network for control flow analysis'
         },
         'bert': {
-            'status': 'loaded' if BERT_LOADED else 'not_loaded',
+            'status': 'loaded' if bert_loaded() else ('not_loaded' if SERVE_BERT else 'disabled'),
             'model_path': '../../models/bert/bert_malware_detector.pth',
             'description': 'BERT-based semantic analysis'
         },
@@ -165,18 +454,66 @@ def models_info():
         }
     }
 
-    return jsonify(info), 200
+    return JSONResponse(info, status_code=200)
+
+
+async def clear_cache(request):
+    """
+    Drop all cached predictions
+
+    entries_removed counts the server's result caches, the only result
+    cache on this path. The BERT predictor's [CLS] embedding cache is
+    dropped as well, so no later prediction reuses stale encoder output.
+    """
+    cleared = {
+        'gnn': len(request.app.state.gnn_cache),
+        'bert': len(request.app.state.bert_cache)
+    }
+    request.app.state.gnn_cache.clear()
+    request.app.state.bert_cache.clear()
+
+    if bert_loaded():
+        _bert().clear_cache()
+
+    return JSONResponse({'status': 'cleared', 'entries_removed': cleared}, status_code=200)
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health, methods=['GET']),
+        Route('/api/ml/gnn/analyze', analyze_gnn, methods=['POST']),
+        Route('/api/ml/gnn/analyze_bulk', analyze_gnn_bulk, methods=['POST']),
+        Route('/api/ml/bert/analyze', analyze_bert, methods=['POST']),
+        Route('/api/ml/bert/analyze_bulk', analyze_bert_bulk, methods=['POST']),
+        Route('/api/ml/models/info', models_info, methods=['GET']),
+        Route('/api/ml/cache/clear', clear_cache, methods=['POST']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])  # Enable CORS for frontend
+    ],
+    lifespan=lifespan
+)
 
 
 if __name__ == '__main__':
+    import sys
+    import uvicorn
+
+    # Running the file directly: make ML_Engine importable for the lazy model imports
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
     port = int(os.environ.get('ML_API_PORT', 5001))
-    print(f"[ML API] Starting server on port {port}")
-    print(f"[ML API] GNN Model: {'LOADED' if GNN_LOADED else 'NOT LOADED'}")
-    print(f"[ML API] BERT Model: {'LOADED' if BERT_LOADED else 'NOT LOADED'}")
+    print(f"[ML API] Starting server on port {port} (role: {ML_API_ROLE})")
+    print(f"[ML API] GNN Model: {'LAZY' if SERVE_GNN else 'DISABLED'}")
+    print(f"[ML API] BERT Model: {'LAZY' if SERVE_BERT else 'DISABLED'}")
     print(f"[ML API] Endpoints:")
     print(f"  - POST http://localhost:{port}/api/ml/gnn/analyze")
+    print(f"  - POST http://localhost:{port}/api/ml/gnn/analyze_bulk")
     print(f"  - POST http://localhost:{port}/api/ml/bert/analyze")
+    print(f"  - POST http://localhost:{port}/api/ml/bert/analyze_bulk")
     print(f"  - GET  http://localhost:{port}/api/ml/models/info")
+    print(f"  - POST http://localhost:{port}/api/ml/cache/clear")
     print(f"  - GET  http://localhost:{port}/health")
 
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # Single worker: the models are loaded once and owned by the inference loops
+    uvicorn.run(app, host='0.0.0.0', port=port, workers=1, loop='auto')
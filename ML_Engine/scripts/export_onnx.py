@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Export the trained BERT and GNN classifiers to ONNX for ONNX Runtime serving
+Run once after training; the API picks the .onnx files up automatically
+
+Usage: python scripts/export_onnx.py [bert] [gnn] [--int8]
+With no model names both are exported. Pass --int8 to store a dynamically
+quantized (INT8 weight) BERT model instead, which runs faster on CPU-only hosts.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bert.inference import BERTPredictor, DEFAULT_ONNX_PATH, export_onnx
+
+
+def export_bert(output_path=DEFAULT_ONNX_PATH, opset_version=17, int8=False):
+    """Export MalwareBERT (input_ids, attention_mask) -> logits with dynamic batch/sequence axes"""
+    predictor = BERTPredictor(precision='fp32', compile_model=False)
+
+    # Quantization reads the fp32 graph and writes the final file
+    export_path = output_path + '.fp32' if int8 else output_path
+    export_onnx(predictor, export_path, opset_version=opset_version)
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(export_path, output_path, weight_type=QuantType.QInt8)
+        os.remove(export_path)
+        print("✓ Weights quantized to INT8")
+
+    print(f"✓ BERT model exported to: {output_path}")
+
+
+def export_gnn(opset_version=18):
+    """Export MalwareGNN (x, edge_index) -> (logits, embedding) with dynamic node/edge axes"""
+    from gnn.inference import GNNPredictor, DEFAULT_ONNX_PATH as GNN_ONNX_PATH, export_onnx as export_gnn_onnx
+
+    predictor = GNNPredictor(compile_model=False, precision='fp32')
+    export_gnn_onnx(predictor, GNN_ONNX_PATH, opset_version=opset_version)
+    print(f"✓ GNN model exported to: {GNN_ONNX_PATH}")
+
+
+if __name__ == '__main__':
+    models = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or ['bert', 'gnn']
+
+    if 'bert' in models:
+        export_bert(int8='--int8' in sys.argv)
+    if 'gnn' in models:
+        export_gnn()
@@ -6,13 +6,21 @@ Creates realistic system administration and deployment scripts
 
 import os
 import random
+import string
+from concurrent.futures import ThreadPoolExecutor
 
-# Template benign scripts
+
+class ScriptTemplate(string.Template):
+    """Template using @@{NAME} placeholders so shell $VARS are left untouched"""
+    delimiter = '@@'
+
+
+# Template benign scripts (@@{NAME} marks a randomized parameter)
 BENIGN_TEMPLATES = [
     # System monitoring
     """#!/bin/bash
 # System monitoring script
-LOG_DIR="/var/log/monitoring"
+LOG_DIR="@@{LOG_DIR}"
 mkdir -p $LOG_DIR
 
 echo "=== System Status Report ===" > $LOG_DIR/status_$(date +%Y%m%d).log
@@ -38,7 +46,7 @@ echo "Status report saved to $LOG_DIR"
 # Database backup script
 BACKUP_DIR="/backups/database"
 DATE=$(date +%Y%m%d_%H%M%S)
-DB_NAME="production_db"
+DB_NAME="@@{DB_NAME}"
 
 mkdir -p $BACKUP_DIR
 
@@ -119,7 +127,7 @@ echo "Log rotation complete"
     # Service health check
     """#!/bin/bash
 # Service health check script
-SERVICES=("nginx" "mysql" "redis" "nodejs")
+SERVICES=("@@{SERVICE}" "mysql" "redis" "nodejs")
 
 echo "=== Service Health Check ==="
 echo "Checking at: $(date)"
@@ -146,7 +154,7 @@ echo "Health check complete"
     # Deployment script
     """#!/bin/bash
 # Application deployment script
-APP_DIR="/opt/myapp"
+APP_DIR="@@{APP_DIR}"
 REPO_URL="https://github.com/user/myapp.git"
 BRANCH="main"
 
@@ -211,7 +219,7 @@ echo "Cleanup complete!"
     # User setup
     """#!/bin/bash
 # User environment setup
-USERNAME="developer"
+USERNAME="@@{USERNAME}"
 
 echo "Setting up environment for $USERNAME..."
 
@@ -291,47 +299,50 @@ fi
 """
 ]
 
-def generate_variations(base_count=26):
+# Parse each template once
+TEMPLATES = [ScriptTemplate(template) for template in BENIGN_TEMPLATES]
+
+
+def _write_script(job):
+    """Write one (filepath, script) pair to disk"""
+    filepath, script = job
+    with open(filepath, 'w') as f:
+        f.write(script)
+    return filepath
+
+
+def generate_variations(base_count=26, max_workers=16):
     """Generate variations of benign scripts"""
     output_dir = "../datasets/raw/benign"
     os.makedirs(output_dir, exist_ok=True)
 
-    generated = 0
-    template_idx = 0
-
-    while generated < base_count:
+    # Render every script first; random values are drawn on this thread only
+    jobs = []
+    for idx in range(base_count):
         # Get base template
-        template = BENIGN_TEMPLATES[template_idx % len(BENIGN_TEMPLATES)]
-
-        # Create variations by modifying parameters
-        script = template
-
-        # Random variations
-        variations = [
-            ('LOG_DIR="/var/log/monitoring"', f'LOG_DIR="/var/log/app{random.randint(1,99)}"'),
-            ('DB_NAME="production_db"', f'DB_NAME="app_db_{random.randint(1,50)}"'),
-            ('SERVICES=("nginx"', f'SERVICES=("apache{random.randint(1,9)}"'),
-            ('USERNAME="developer"', f'USERNAME="user{random.randint(100,999)}"'),
-            ('/opt/myapp', f'/opt/application{random.randint(1,20)}'),
-        ]
+        template = TEMPLATES[idx % len(TEMPLATES)]
 
-        for old, new in variations:
-            if old in script:
-                script = script.replace(old, new)
-                break
+        # Random parameter values; templates without a placeholder ignore them
+        params = {
+            'LOG_DIR': f'/var/log/app{random.randint(1,99)}',
+            'DB_NAME': f'app_db_{random.randint(1,50)}',
+            'SERVICE': f'apache{random.randint(1,9)}',
+            'USERNAME': f'user{random.randint(100,999)}',
+            'APP_DIR': f'/opt/application{random.randint(1,20)}',
+        }
 
-        # Save script
-        filename = f"benign_{generated + 1:03d}.sh"
-        filepath = os.path.join(output_dir, filename)
+        # Render in a single pass
+        script = template.safe_substitute(params)
 
-        with open(filepath, 'w') as f:
-            f.write(script)
+        filename = f"benign_{idx + 1:03d}.sh"
+        jobs.append((os.path.join(output_dir, filename), script))
 
-        print(f"Generated: {filename}")
-        generated += 1
-        template_idx += 1
+    # Save scripts; file writes are I/O bound so threads overlap them
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for filepath in executor.map(_write_script, jobs):
+            print(f"Generated: {os.path.basename(filepath)}")
 
-    print(f"\n✓ Generated {generated} synthetic benign scripts")
+    print(f"\n✓ Generated {len(jobs)} synthetic benign scripts")
     print(f"Location: {output_dir}/")
 
 
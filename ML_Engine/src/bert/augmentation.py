@@ -3,10 +3,18 @@ Data Augmentation Module for Shell Script Malware Detection
 Generates synthetic variations of shell scripts to expand the training dataset
 """
 
+import os
 import re
 import random
 import copy
-from typing import List, Tuple
+import numpy as np
+from functools import lru_cache, partial
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+
+
+# Variable assignment, e.g. `url=` in `url="http://..."`
+_VAR_RE = re.compile(r'\b([a-zA-Z_][a-zA-Z0-9_]*)=')
 
 
 class ShellScriptAugmenter:
@@ -39,8 +47,9 @@ class ShellScriptAugmenter:
     ]
     
     def __init__(self, seed: int = None):
-        if seed is not None:
-            random.seed(seed)
+        # Private generators so concurrent augmenters don't share global state
+        self._rng = random.Random(seed)
+        self._np_rng = np.random.default_rng(seed)
     
     def augment(self, script: str, num_variations: int = 3) -> List[str]:
         """
@@ -54,9 +63,11 @@ class ShellScriptAugmenter:
             List of augmented script variations
         """
         variations = []
+        base_lines = script.split('\n')
         
         for i in range(num_variations):
-            augmented = script
+            # Augmentations pass line lists along; join only once at the end
+            lines = base_lines
             
             # Apply random augmentations
             augmentations = [
@@ -69,85 +80,88 @@ class ShellScriptAugmenter:
             ]
             
             # Apply 2-4 random augmentations
-            selected = random.sample(augmentations, min(len(augmentations), random.randint(2, 4)))
+            selected = self._rng.sample(augmentations, min(len(augmentations), self._rng.randint(2, 4)))
             
             for aug_func in selected:
                 try:
-                    augmented = aug_func(augmented)
+                    lines = aug_func(lines)
                 except Exception:
                     pass  # Skip failed augmentations
             
+            augmented = '\n'.join(lines)
             if augmented != script and augmented not in variations:
                 variations.append(augmented)
         
         return variations
     
-    def _add_whitespace_variation(self, script: str) -> str:
+    def _add_whitespace_variation(self, lines: List[str]) -> List[str]:
         """Add/remove whitespace variations"""
-        lines = script.split('\n')
-        result = []
+        # Draw all per-line decisions up front
+        blank_before = self._np_rng.random(len(lines)) > 0.7
+        blank_after = self._np_rng.random(len(lines)) > 0.8
         
-        for line in lines:
-            if random.random() > 0.7:
-                # Add blank line before
+        result = []
+        for line, before, after in zip(lines, blank_before.tolist(), blank_after.tolist()):
+            if before:
                 result.append('')
             result.append(line)
-            if random.random() > 0.8:
-                # Add blank line after
+            if after:
                 result.append('')
         
-        return '\n'.join(result)
+        return result
     
-    def _swap_command_aliases(self, script: str) -> str:
+    def _swap_command_aliases(self, lines: List[str]) -> List[str]:
         """Swap commands with their aliases"""
-        result = script
-        
-        for cmd, aliases in self.COMMAND_ALIASES.items():
-            if cmd in result and random.random() > 0.5:
-                replacement = random.choice(aliases)
-                # Only replace first occurrence to avoid breaking syntax
-                result = result.replace(cmd, replacement, 1)
-        
-        return result
+        swapped = set()
+
+        def swap(match):
+            cmd = match.group(0)
+            # Only consider the first occurrence of each command to avoid breaking syntax
+            if cmd in swapped:
+                return cmd
+            swapped.add(cmd)
+            if self._rng.random() > 0.5:
+                return self._rng.choice(self.COMMAND_ALIASES[cmd])
+            return cmd
+
+        # Aliases never span a newline, so each line can be rewritten on its own
+        return [_ALIAS_RE.sub(swap, line) for line in lines]
     
-    def _add_comments(self, script: str) -> str:
+    def _add_comments(self, lines: List[str]) -> List[str]:
         """Add random comments to script"""
-        if not script.startswith('#'):
-            header = random.choice(self.COMMENTS)
-            return f"{header}\n{script}"
+        if not lines[0].startswith('#'):
+            header = self._rng.choice(self.COMMENTS)
+            return [header] + lines
         
-        lines = script.split('\n')
         result = [lines[0]]  # Keep shebang
         
         for line in lines[1:]:
-            if random.random() > 0.85 and line.strip() and not line.strip().startswith('#'):
-                result.append(f"# Step: {random.choice(['process', 'setup', 'execute', 'configure'])}")
+            if self._rng.random() > 0.85 and line.strip() and not line.strip().startswith('#'):
+                result.append(f"# Step: {self._rng.choice(['process', 'setup', 'execute', 'configure'])}")
             result.append(line)
         
-        return '\n'.join(result)
-    
-    def _vary_variable_names(self, script: str) -> str:
-        """Change variable names to variations"""
-        result = script
-        
-        # Find existing variable assignments
-        var_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)='
-        matches = re.findall(var_pattern, script)
-        
-        for var_name in matches:
-            if len(var_name) < 3 or var_name.isupper():
-                continue  # Skip single letters and environment vars
-            
-            # Find a suitable replacement
-            for name_group in self.VAR_NAMES:
-                if var_name.lower() in name_group:
-                    new_name = random.choice([n for n in name_group if n != var_name.lower()])
-                    result = result.replace(var_name, new_name)
-                    break
-        
         return result
     
-    def _add_noop_commands(self, script: str) -> str:
+    def _vary_variable_names(self, lines: List[str]) -> List[str]:
+        """Change variable names to variations"""
+        # Pick one replacement per assigned variable that has a known name group
+        renames = {}
+        for var_name in (name for line in lines for name in _VAR_RE.findall(line)):
+            if len(var_name) < 3 or var_name.isupper() or var_name in renames:
+                continue  # Skip single letters, environment vars and repeats
+
+            name_group = _VAR_LOOKUP.get(var_name.lower())
+            if name_group:
+                renames[var_name] = self._rng.choice([n for n in name_group if n != var_name.lower()])
+
+        if not renames:
+            return lines
+
+        # Rewrite every occurrence of the renamed variables in one pass
+        rename_re = _rename_pattern(frozenset(renames))
+        return [rename_re.sub(lambda m: renames[m.group(0)], line) for line in lines]
+
+    def _add_noop_commands(self, lines: List[str]) -> List[str]:
         """Add harmless no-op commands"""
         noops = [
             'true',
@@ -155,22 +169,22 @@ class ShellScriptAugmenter:
             'sleep 0',
         ]
         
-        lines = script.split('\n')
-        result = []
+        # Draw all per-line decisions and no-op choices up front
+        insert = self._np_rng.random(len(lines)) > 0.9
+        picks = self._np_rng.integers(0, len(noops), len(lines))
         
-        for line in lines:
+        result = []
+        for line, add_noop, pick in zip(lines, insert.tolist(), picks.tolist()):
             result.append(line)
-            if random.random() > 0.9 and line.strip() and not line.strip().startswith('#'):
-                result.append(random.choice(noops))
+            if add_noop and line.strip() and not line.strip().startswith('#'):
+                result.append(noops[pick])
         
-        return '\n'.join(result)
+        return result
     
-    def _reorder_independent_lines(self, script: str) -> str:
+    def _reorder_independent_lines(self, lines: List[str]) -> List[str]:
         """Reorder lines that don't have dependencies"""
-        lines = script.split('\n')
-        
         if len(lines) < 4:
-            return script
+            return lines
         
         # Keep first 2 lines (shebang, variable declarations)
         # and last line intact
@@ -179,44 +193,82 @@ class ShellScriptAugmenter:
         middle = lines[2:-1] if len(lines) > 3 else []
         
         # Only shuffle if we have enough middle lines
-        if len(middle) >= 2 and random.random() > 0.7:
+        if len(middle) >= 2 and self._rng.random() > 0.7:
             # Shuffle a subset of middle lines
-            shuffle_start = random.randint(0, len(middle) - 2)
+            shuffle_start = self._rng.randint(0, len(middle) - 2)
             shuffle_end = min(shuffle_start + 3, len(middle))
             subset = middle[shuffle_start:shuffle_end]
-            random.shuffle(subset)
+            self._rng.shuffle(subset)
             middle[shuffle_start:shuffle_end] = subset
         
-        return '\n'.join(header + middle + footer)
+        return header + middle + footer
+
+
+# Variable name -> its group of interchangeable names
+_VAR_LOOKUP = {name: group for group in ShellScriptAugmenter.VAR_NAMES for name in group}
+
+# All aliased commands in one alternation; longest first so `rm -rf` wins over shorter prefixes
+_ALIAS_RE = re.compile('|'.join(
+    re.escape(cmd) for cmd in sorted(ShellScriptAugmenter.COMMAND_ALIASES, key=len, reverse=True)
+))
+
+
+@lru_cache(maxsize=1024)
+def _rename_pattern(names: frozenset) -> re.Pattern:
+    """Compiled word-bounded alternation of `names`, longest first"""
+    ordered = sorted(names, key=lambda n: (-len(n), n))
+    return re.compile(r'\b(?:' + '|'.join(map(re.escape, ordered)) + r')\b')
+
+
+def _augment_one(item: Tuple[int, str, int], augmentation_factor: int, seed: int) -> Tuple[List[str], List[int]]:
+    """Augment a single (index, script, label) item with a seed derived from its index"""
+    index, script, label = item
+    augmenter = ShellScriptAugmenter(seed=(seed * 1_000_003 + index) & 0xffffffff)
+    variations = augmenter.augment(script, num_variations=augmentation_factor)
+    return variations, [label] * len(variations)
 
 
 def augment_dataset(
     scripts: List[str],
     labels: List[int],
     augmentation_factor: int = 3,
-    seed: int = 42
+    seed: int = 42,
+    num_workers: Optional[int] = None
 ) -> Tuple[List[str], List[int]]:
     """
     Augment an entire dataset of scripts
     
+    Scripts are augmented in parallel worker processes. Each script gets its
+    own seed derived from `seed` and its position, so the output is the same
+    regardless of how many workers are used.
+    
     Args:
         scripts: List of original scripts
         labels: List of corresponding labels
         augmentation_factor: Number of variations per script
         seed: Random seed for reproducibility
+        num_workers: Worker processes (defaults to CPU count, 1 runs in-process)
         
     Returns:
         Tuple of (augmented_scripts, augmented_labels)
     """
-    augmenter = ShellScriptAugmenter(seed=seed)
+    items = [(idx, script, label) for idx, (script, label) in enumerate(zip(scripts, labels))]
+    augment_one = partial(_augment_one, augmentation_factor=augmentation_factor, seed=seed)
+    
+    num_workers = num_workers or os.cpu_count() or 1
+    if num_workers == 1 or len(items) < 2:
+        results = list(map(augment_one, items))
+    else:
+        chunksize = max(1, min(64, len(items) // (num_workers * 4)))
+        with Pool(processes=num_workers) as pool:
+            results = pool.map(augment_one, items, chunksize=chunksize)
     
     aug_scripts = list(scripts)  # Keep originals
     aug_labels = list(labels)
     
-    for script, label in zip(scripts, labels):
-        variations = augmenter.augment(script, num_variations=augmentation_factor)
+    for variations, variation_labels in results:
         aug_scripts.extend(variations)
-        aug_labels.extend([label] * len(variations))
+        aug_labels.extend(variation_labels)
     
     print(f"[Augmentation] Original: {len(scripts)} -> Augmented: {len(aug_scripts)} samples")
     
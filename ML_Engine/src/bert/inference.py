@@ -4,23 +4,66 @@ Load trained model and make predictions on new shell scripts
 """
 
 import torch
+import numpy as np
+import collections
+import copy
+import functools
+import hashlib
 import json
 import os
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List
 import sys
 
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from bert.model import MalwareBERT, get_tokenizer, prepare_input
-from bert.preprocessor import ShellScriptPreprocessor
+from bert.model import MalwareBERT, get_tokenizer, predictions_from_logits
+from bert.preprocessor import ScriptFeatures, ShellScriptPreprocessor
+
+
+# Used when no model_config.json exists next to the weights
+DEFAULT_CONFIG = {
+    'model_architecture': {
+        'pretrained_model': 'distilbert-base-uncased',
+        'max_length': 512,
+        'dropout': 0.3,
+        'num_classes': 2
+    }
+}
+
+
+@functools.lru_cache(maxsize=16)
+def _load_config_cached(config_path: str) -> dict:
+    """Parse a model config once per process (orjson when installed)"""
+    if not os.path.exists(config_path):
+        return DEFAULT_CONFIG
+    with open(config_path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
 
 class BERTPredictor:
     """Inference wrapper for trained BERT model"""
 
-    def __init__(self, model_path=None, config_path=None):
+    def __init__(self, model_path=None, config_path=None, precision=None, cache_size=1024,
+                 compile_model=None, embedding_cache_size=4096):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
+        # Inference precision: fp32, fp16 (CUDA only) or int8 (CPU dynamic quantization).
+        # Defaults to int8 on CPU, where quantized Linear layers are 2-4x faster
+        default_precision = 'int8' if self.device.type == 'cpu' else 'fp32'
+        self.precision = (precision or os.environ.get('ML_API_PRECISION', default_precision)).lower()
+
         # Default paths
         if model_path is None:
             model_path = os.path.join(os.path.dirname(__file__), '../../models/bert/bert_malware_detector.pth')
@@ -38,37 +81,47 @@ class BERTPredictor:
         self.preprocessor = ShellScriptPreprocessor(max_length=max_length)
         self.tokenizer = get_tokenizer(pretrained_model)
 
+        # Set by _compile_model; compiled graphs are specialised per input shape
+        self.compiled = False
+        self._compile_requested = (
+            compile_model if compile_model is not None else os.environ.get('ML_API_COMPILE', '1') != '0'
+        )
+
+        # Side stream for pinned host-to-device copies of tokenized batches
+        self._copy_stream = torch.cuda.Stream() if self.device.type == 'cuda' else None
+
+        # LRU of script content hash -> prediction result
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+
+        # LRU of prepared BERT text hash -> [CLS] embedding. Different scripts often
+        # reduce to the same text, and a hit only needs the classification head
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache = collections.OrderedDict()
+
         # Initialize and load model
         self.model = self._load_model(model_path)
 
     def _load_config(self, config_path):
-        """Load model configuration"""
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                return json.load(f)
-        else:
-            # Default config if file doesn't exist
-            return {
-                'model_architecture': {
-                    'pretrained_model': 'distilbert-base-uncased',
-                    'max_length': 512,
-                    'dropout': 0.3,
-                    'num_classes': 2
-                }
-            }
+        """Load model configuration (read from disk once per path)"""
+        # Copy so an instance editing its config can't change the cached one
+        return copy.deepcopy(_load_config_cached(os.path.abspath(config_path)))
 
     def _load_model(self, model_path):
         """Load trained model"""
         arch = self.config.get('model_architecture', {})
 
+        # A trained checkpoint holds every encoder weight, so only the architecture is needed
+        has_checkpoint = os.path.exists(model_path)
         model = MalwareBERT(
             pretrained_model=arch.get('pretrained_model', 'distilbert-base-uncased'),
             num_classes=arch.get('num_classes', 2),
             dropout=arch.get('dropout', 0.3),
-            freeze_bert=False
+            freeze_bert=False,
+            pretrained_weights=not has_checkpoint
         ).to(self.device)
 
-        if os.path.exists(model_path):
+        if has_checkpoint:
             model.load_state_dict(torch.load(model_path, map_location=self.device))
             model.eval()
             print(f"[BERT] Model loaded from: {model_path}")
@@ -76,56 +129,304 @@ class BERTPredictor:
             print(f"[BERT] WARNING: Model file not found at {model_path}")
             print(f"[BERT] Using untrained model. Train first using: python src/bert/train.py")
 
+        return self._compile_model(self._apply_precision(model))
+
+    def _compile_model(self, model):
+        """
+        Compile the forward pass with torch.compile on CUDA
+
+        Fuses the classification head's pointwise ops and captures CUDA graphs.
+        Pass compile_model=False or set ML_API_COMPILE=0 to skip compilation
+        (e.g. for faster startup).
+        """
+        if not self._compile_requested or not hasattr(torch, 'compile') or self.device.type != 'cuda':
+            return model
+
+        # Sequence lengths are bucketed (see _tokenize), batch sizes vary up to MAX_BATCH
+        torch._dynamo.config.cache_size_limit = 64
+        model.encode = torch.compile(model.encode, mode='reduce-overhead', fullgraph=False)
+        self.compiled = True
+        print("[BERT] Encoder compiled with torch.compile")
+        return model
+
+    def _apply_precision(self, model):
+        """Convert loaded model to the requested inference precision"""
+        if self.precision == 'fp16':
+            if self.device.type == 'cuda':
+                model = model.half()
+                print("[BERT] Using FP16 weights")
+            else:
+                print("[BERT] WARNING: fp16 requires CUDA, falling back to fp32")
+                self.precision = 'fp32'
+
+        elif self.precision == 'int8':
+            if self.device.type == 'cpu':
+                try:
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                    print("[BERT] Using dynamic INT8 quantization for Linear layers")
+                except Exception as e:
+                    # e.g. no quantized engine for this CPU; the fp32 weights are still intact
+                    print(f"[BERT] WARNING: INT8 quantization failed ({e}), using fp32")
+                    self.precision = 'fp32'
+            else:
+                print("[BERT] WARNING: int8 dynamic quantization is CPU-only, falling back to fp32")
+                self.precision = 'fp32'
+
+        elif self.precision != 'fp32':
+            print(f"[BERT] WARNING: Unknown precision '{self.precision}', using fp32")
+            self.precision = 'fp32'
+
+        model.eval()
         return model
 
-    def predict(self, script_content: str) -> Dict[str, Any]:
+    def predict(self, script_content: str, return_logits: bool = False) -> Dict[str, Any]:
         """
         Predict if script is malicious
 
         Args:
             script_content: Shell script as string
+            return_logits: Also include the raw model logits in the result
 
         Returns:
             Dictionary with prediction results
         """
-        try:
-            # Preprocess script
-            text, features = self.preprocessor.prepare_for_bert(script_content)
+        # Single scripts share the batched path (a batch of one)
+        return self.predict_batch([script_content], return_logits=return_logits)[0]
 
-            # Prepare input for BERT
-            input_ids, attention_mask = prepare_input(
-                text,
-                self.tokenizer,
-                max_length=self.config['model_architecture'].get('max_length', 512),
-                device=self.device
-            )
+    def predict_batch(self, scripts: List[str], batch_size: int = 32,
+                      return_logits: bool = False, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Predict a list of scripts, serving repeats from the result cache
 
-            # Make prediction
-            result = self.model.predict(input_ids, attention_mask)
+        Args:
+            scripts: Shell scripts as strings
+            batch_size: Maximum number of sequences per forward pass
+            return_logits: Also include the raw model logits in each result
+            use_cache: Read and fill the result cache; callers with their own
+                result cache (the API server) pass False
 
-            # Add preprocessing features
-            result['semantic_features'] = features
-            result['risk_score'] = float(result['prob_malicious'] * 100)
+        Returns:
+            List of prediction dictionaries, in the same order as scripts
+        """
+        if not use_cache:
+            return self._predict_uncached(scripts, batch_size, return_logits)
+
+        results = [None] * len(scripts)
+        misses = []
+
+        for idx, script_content in enumerate(scripts):
+            key = self._cache_key(script_content, return_logits)
+            cached = self._cache_lookup(key)
+            if cached is not None:
+                results[idx] = cached
+            else:
+                misses.append((idx, key, script_content))
+
+        if misses:
+            predictions = self._predict_uncached([script for _, _, script in misses], batch_size, return_logits)
+            for (idx, key, _), result in zip(misses, predictions):
+                self._cache_store(key, result)
+                results[idx] = result
 
-            # Identify threat indicators from features
-            result['threat_indicators'] = self._identify_threats(features)
+        return results
 
-            # Determine threat category
-            result['threat_category'] = self._categorize_threat(features)
+    def clear_cache(self) -> int:
+        """
+        Drop all cached predictions and [CLS] embeddings
 
-            return result
+        Returns:
+            Number of prediction entries removed
+        """
+        removed = len(self._cache)
+        self._cache.clear()
+        self._embedding_cache.clear()
+        return removed
+
+    @staticmethod
+    def _cache_key(script_content, return_logits: bool = False):
+        """Content hash used to look up cached predictions (None if uncacheable)"""
+        if not isinstance(script_content, str):
+            return None
+        digest = hashlib.blake2b(script_content.encode('utf-8', 'ignore'), digest_size=16).digest()
+        # Results with and without logits are cached separately
+        return (digest, True) if return_logits else digest
+
+    def _cache_lookup(self, key):
+        """Copy of the cached result for key, or None on a miss"""
+        if key is None or key not in self._cache:
+            return None
+        self._cache.move_to_end(key)
+        # Callers may mutate results (e.g. analyze_batch adds filepath)
+        return copy.deepcopy(self._cache[key])
+
+    def _cache_store(self, key, result: Dict[str, Any]):
+        """Remember a successful result, evicting the least recently used entry"""
+        if key is None or 'error' in result:
+            return
+        self._cache[key] = copy.deepcopy(result)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _predict_uncached(self, scripts: List[str], batch_size: int,
+                          return_logits: bool = False) -> List[Dict[str, Any]]:
+        """
+        Predict a list of scripts with batched tokenization and forward passes
+
+        Texts are sorted by length before chunking so each batch is padded
+        only to its own longest member (see _tokenize).
+
+        Args:
+            scripts: Shell scripts as strings
+            batch_size: Maximum number of sequences per forward pass
+            return_logits: Also include the raw model logits in each result
+
+        Returns:
+            List of prediction dictionaries, in the same order as scripts
+        """
+        results = [None] * len(scripts)
+
+        # Preprocess; a script that fails here only fails its own result
+        prepared = []
+        for idx, script_content in enumerate(scripts):
+            try:
+                text, features = self.preprocessor.prepare_for_bert(script_content)
+                prepared.append((idx, text, features))
+            except Exception as e:
+                results[idx] = self._error_result(e)
+
+        prepared.sort(key=lambda item: len(item[1]))
+
+        for start in range(0, len(prepared), batch_size):
+            self._predict_chunk(prepared[start:start + batch_size], results, return_logits)
+
+        return results
+
+    def _predict_chunk(self, chunk: list, results: list, return_logits: bool = False):
+        """
+        Tokenize and run one batch of preprocessed scripts through the model
 
+        Args:
+            chunk: List of (result_index, text, features) tuples
+            results: Result list to fill in at each result_index
+            return_logits: Also include the raw model logits in each result
+        """
+        try:
+            texts = [text for _, text, _ in chunk]
+            if hasattr(self.model, 'embed'):
+                predictions = self.model.predict_embeddings(self._embeddings(texts), return_logits)
+            else:
+                # ONNX Runtime model: no separate encoder to cache
+                encoded = self._tokenize(texts)
+                input_ids, attention_mask = self._to_device(encoded['input_ids'], encoded['attention_mask'])
+                predictions = self.model.predict_batch(input_ids, attention_mask, return_logits)
+            for (idx, _, features), result in zip(chunk, predictions):
+                results[idx] = self._finalize_result(result, features)
         except Exception as e:
-            return {
-                'error': str(e),
-                'predicted_class': -1,
-                'is_malicious': False,
-                'confidence': 0.0,
-                'risk_score': 0.0,
-                'threat_category': 'unknown'
-            }
-
-    def _identify_threats(self, features: Dict) -> list:
+            for idx, _, _ in chunk:
+                results[idx] = self._error_result(e)
+
+    def _embeddings(self, texts: List[str]) -> list:
+        """
+        [CLS] embeddings for prepared texts, running the encoder only on cache misses
+
+        Returns:
+            List of [bert_dim] tensors, one per text
+        """
+        keys = [hashlib.blake2b(text.encode('utf-8', 'ignore'), digest_size=16).digest() for text in texts]
+        embeddings = [None] * len(texts)
+        misses = []
+        missed_keys = set()
+
+        for i, key in enumerate(keys):
+            if key in self._embedding_cache:
+                self._embedding_cache.move_to_end(key)
+                embeddings[i] = self._embedding_cache[key]
+            elif key not in missed_keys:
+                # Encode each distinct text only once per batch
+                misses.append(i)
+                missed_keys.add(key)
+
+        if misses:
+            encoded = self._tokenize([texts[i] for i in misses])
+            input_ids, attention_mask = self._to_device(encoded['input_ids'], encoded['attention_mask'])
+            encoded_cls = self.model.embed(input_ids, attention_mask)
+
+            for i, row in zip(misses, encoded_cls):
+                # Clone so a cached row does not keep its whole batch alive
+                self._embedding_cache[keys[i]] = row.clone()
+                if len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+
+            # Duplicates within this batch (and rows just evicted) come from the fresh batch
+            fresh = {keys[i]: row for i, row in zip(misses, encoded_cls)}
+            embeddings = [e if e is not None else fresh[key] for e, key in zip(embeddings, keys)]
+
+        return embeddings
+
+    def _tokenize(self, texts: List[str]):
+        """
+        Tokenize a batch, padded only as far as its longest sequence
+
+        When the model is compiled, the padded length is rounded up to a
+        power of two (at least 64, at most max_length) so only a handful of
+        sequence shapes ever reach the compiled graph.
+        """
+        max_length = self.config['model_architecture'].get('max_length', 512)
+
+        if not self.compiled:
+            return self.tokenizer(texts, padding=True, truncation=True, max_length=max_length, return_tensors='pt')
+
+        encoded = self.tokenizer(texts, padding=False, truncation=True, max_length=max_length)
+        longest = max(len(ids) for ids in encoded['input_ids'])
+        bucket = min(max_length, max(64, 1 << (longest - 1).bit_length()))
+        return self.tokenizer.pad(encoded, padding='max_length', max_length=bucket, return_tensors='pt')
+
+    def _to_device(self, *tensors):
+        """
+        Move tokenized tensors to the model device
+
+        On CUDA the tensors are pinned and copied asynchronously on a side
+        stream; the compute stream waits for the copy before using them.
+        """
+        if self.device.type != 'cuda' or self._copy_stream is None:
+            return tensors
+
+        with torch.cuda.stream(self._copy_stream):
+            moved = [t.pin_memory().to(self.device, non_blocking=True) for t in tensors]
+
+        compute_stream = torch.cuda.current_stream()
+        compute_stream.wait_stream(self._copy_stream)
+        for t in moved:
+            # Allocated on the copy stream but consumed on the compute stream
+            t.record_stream(compute_stream)
+        return moved
+
+    def _finalize_result(self, result: Dict, features: ScriptFeatures) -> Dict[str, Any]:
+        """Attach semantic features, threat indicators and category to a raw model prediction"""
+        # Add preprocessing features
+        result['semantic_features'] = features.to_dict()
+        result['risk_score'] = float(result['prob_malicious'] * 100)
+
+        # Identify threat indicators from features
+        result['threat_indicators'] = self._identify_threats(features)
+
+        # Determine threat category
+        result['threat_category'] = self._categorize_threat(features)
+
+        return result
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Prediction dictionary returned when a script cannot be analyzed"""
+        return {
+            'error': str(error),
+            'predicted_class': -1,
+            'is_malicious': False,
+            'confidence': 0.0,
+            'risk_score': 0.0,
+            'threat_category': 'unknown'
+        }
+
+    def _identify_threats(self, features: ScriptFeatures) -> list:
         """
         Identify specific threat indicators from features
 
@@ -134,68 +435,68 @@ class BERTPredictor:
         """
         threats = []
 
-        if features['urls']:
+        if features.urls:
             threats.append({
                 'type': 'Network Activity',
-                'description': f"Found {len(features['urls'])} URL(s)",
-                'severity': 'high' if len(features['urls']) > 2 else 'medium',
-                'samples': features['urls'][:3]
+                'description': f"Found {len(features.urls)} URL(s)",
+                'severity': 'high' if len(features.urls) > 2 else 'medium',
+                'samples': features.urls[:3]
             })
 
-        if features['ips']:
+        if features.ips:
             threats.append({
                 'type': 'IP Addresses',
-                'description': f"Found {len(features['ips'])} IP address(es)",
-                'severity': 'high' if len(features['ips']) > 1 else 'medium',
-                'samples': features['ips'][:3]
+                'description': f"Found {len(features.ips)} IP address(es)",
+                'severity': 'high' if len(features.ips) > 1 else 'medium',
+                'samples': features.ips[:3]
             })
 
-        if features['dangerous_commands']:
+        if features.dangerous_commands:
             threats.append({
                 'type': 'Dangerous Commands',
-                'description': f"Found {len(features['dangerous_commands'])} dangerous command(s)",
-                'severity': 'critical' if len(features['dangerous_commands']) > 3 else 'high',
-                'samples': list(set(features['dangerous_commands']))[:5]
+                'description': f"Found {len(features.dangerous_commands)} dangerous command(s)",
+                'severity': 'critical' if len(features.dangerous_commands) > 3 else 'high',
+                'samples': list(set(features.dangerous_commands))[:5]
             })
 
-        if features['has_base64']:
+        if features.has_base64:
             threats.append({
                 'type': 'Encoded Content',
-                'description': f"Contains {features['base64_count']} base64-encoded string(s)",
+                'description': f"Contains {features.base64_count} base64-encoded string(s)",
                 'severity': 'medium',
                 'samples': []
             })
 
-        if features['obfuscation_score'] > 0.5:
+        if features.obfuscation_score > 0.5:
             threats.append({
                 'type': 'Obfuscation',
-                'description': f"High obfuscation detected (score: {features['obfuscation_score']:.2f})",
+                'description': f"High obfuscation detected (score: {features.obfuscation_score:.2f})",
                 'severity': 'high',
                 'samples': []
             })
 
-        if features['suspicious_patterns']:
-            pattern_count = len(features['suspicious_patterns'])
+        if features.suspicious_patterns:
+            pattern_count = len(features.suspicious_patterns)
             threats.append({
                 'type': 'Suspicious Patterns',
                 'description': f"Found {pattern_count} suspicious pattern(s)",
                 'severity': 'medium' if pattern_count < 5 else 'high',
-                'samples': list(set(features['suspicious_patterns']))[:5]
+                'samples': list(set(features.suspicious_patterns))[:5]
             })
 
         return threats
 
-    def _categorize_threat(self, features: Dict) -> str:
+    def _categorize_threat(self, features: ScriptFeatures) -> str:
         """
         Categorize the type of threat based on features
 
         Returns:
             Threat category name
         """
-        has_network = len(features['urls']) > 0 or len(features['ips']) > 0
-        has_dangerous = len(features['dangerous_commands']) > 0
-        has_obfuscation = features['obfuscation_score'] > 0.5
-        has_encoding = features['has_base64']
+        has_network = len(features.urls) > 0 or len(features.ips) > 0
+        has_dangerous = len(features.dangerous_commands) > 0
+        has_obfuscation = features.obfuscation_score > 0.5
+        has_encoding = features.has_base64
 
         # Category detection
         if has_network and has_dangerous and has_obfuscation:
@@ -208,47 +509,223 @@ class BERTPredictor:
             return "data-exfiltration"
         elif has_dangerous:
             return "system-manipulation"
-        elif features['dangerous_ratio'] > 0.5:
+        elif features.dangerous_ratio > 0.5:
             return "suspicious-commands"
         else:
             return "low-risk"
 
-    def analyze_batch(self, script_paths: list) -> list:
+    def analyze_batch(self, script_paths: list, batch_size: int = 32, num_workers: int = None) -> list:
         """
         Analyze multiple scripts
 
+        Files are read and preprocessed in a thread pool while this thread
+        runs forward passes over batches of already-prepared scripts, so
+        preprocessing overlaps inference instead of running before it.
+
         Args:
             script_paths: List of file paths
+            batch_size: Maximum number of sequences per forward pass
+            num_workers: Preprocessing threads (defaults to CPU count)
 
         Returns:
             List of prediction dictionaries
         """
-        results = []
-        for path in script_paths:
-            try:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                    script = f.read()
-                result = self.predict(script)
-                result['filepath'] = path
-                results.append(result)
-            except Exception as e:
-                results.append({
-                    'filepath': path,
-                    'error': str(e),
-                    'is_malicious': False
-                })
+        results = [None] * len(script_paths)
+        keys = [None] * len(script_paths)
+        ready = []
+
+        with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as pool:
+            futures = {pool.submit(self._load_and_prepare, path): idx for idx, path in enumerate(script_paths)}
+
+            for future in as_completed(futures):
+                idx = futures[future]
+                script, prepared, error = future.result()
+
+                if error is not None:
+                    results[idx] = {
+                        'filepath': script_paths[idx],
+                        'error': str(error),
+                        'is_malicious': False
+                    }
+                    continue
+
+                keys[idx] = self._cache_key(script)
+                cached = self._cache_lookup(keys[idx])
+                if cached is not None:
+                    results[idx] = cached
+                elif isinstance(prepared, Exception):
+                    results[idx] = self._error_result(prepared)
+                else:
+                    ready.append((idx, *prepared))
+
+                if len(ready) == batch_size:
+                    self._predict_ready(ready, results, keys)
+                    ready = []
+
+        if ready:
+            self._predict_ready(ready, results, keys)
+
+        for idx, result in enumerate(results):
+            result['filepath'] = script_paths[idx]
+
         return results
 
+    def _load_and_prepare(self, path: str):
+        """
+        Read and preprocess one script (runs in an analyze_batch worker thread)
+
+        Returns:
+            (script, (text, features) or the preprocessing exception, read error or None)
+        """
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                script = f.read()
+        except Exception as e:
+            return None, None, e
+
+        try:
+            return script, self.preprocessor.prepare_for_bert(script), None
+        except Exception as e:
+            return script, e, None
+
+    def _predict_ready(self, ready: list, results: list, keys: list):
+        """Run a batch of prepared scripts from analyze_batch and cache the results"""
+        ready.sort(key=lambda item: len(item[1]))
+        self._predict_chunk(ready, results)
+        for idx, _, _ in ready:
+            self._cache_store(keys[idx], results[idx])
+
+
+DEFAULT_ONNX_PATH = os.path.join(os.path.dirname(__file__), '../../models/bert/bert_malware_detector.onnx')
+
+
+def export_onnx(predictor: BERTPredictor, output_path: str = DEFAULT_ONNX_PATH, opset_version: int = 17):
+    """
+    Export a predictor's MalwareBERT to ONNX
+
+    The graph maps (input_ids, attention_mask) -> logits with dynamic batch
+    and sequence axes. The predictor must hold an uncompiled fp32 model.
+    """
+    model = predictor.model.to('cpu').eval()
+
+    # Representative input; shapes are dynamic so the text content does not matter
+    encoded = predictor.tokenizer(
+        'commands: wget chmod [SEP] total_commands: 2 dangerous_ratio: 1.00',
+        return_tensors='pt'
+    )
+    dummy_input = (encoded['input_ids'], encoded['attention_mask'])
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            dummy_input,
+            output_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'seq'},
+                'attention_mask': {0: 'batch', 1: 'seq'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=opset_version,
+            do_constant_folding=True
+        )
+
+
+class ONNXMalwareBERT:
+    """
+    ONNX Runtime stand-in for MalwareBERT at inference time
+
+    Exposes the same predict/predict_batch interface, so BERTPredictor's
+    preprocessing and post-processing are reused unchanged.
+    """
+
+    def __init__(self, onnx_path: str):
+        if ort is None:
+            raise ImportError("onnxruntime is required. Run: pip install onnxruntime")
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        available = ort.get_available_providers()
+        providers = [p for p in ('CUDAExecutionProvider', 'CPUExecutionProvider') if p in available]
+
+        self.session = ort.InferenceSession(onnx_path, sess_options, providers=providers)
+
+        # Logits are written straight into a buffer on the provider's device
+        self.output_device = 'cuda' if self.session.get_providers()[0] == 'CUDAExecutionProvider' else 'cpu'
+
+    def _run(self, input_ids, attention_mask, return_logits: bool = False):
+        # IO binding copies the inputs once and skips ORT's per-call feed/fetch marshalling
+        binding = self.session.io_binding()
+        binding.bind_cpu_input('input_ids', input_ids.cpu().numpy())
+        binding.bind_cpu_input('attention_mask', attention_mask.cpu().numpy())
+        binding.bind_output('logits', self.output_device)
+
+        self.session.run_with_iobinding(binding)
+        logits = binding.copy_outputs_to_cpu()[0].astype(np.float32)
+
+        # Numerically stable softmax
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+        return predictions_from_logits(logits if return_logits else None, probs)
+
+    def predict(self, input_ids, attention_mask, return_logits: bool = False):
+        """Make prediction for a single sequence"""
+        return self._run(input_ids, attention_mask, return_logits)[0]
+
+    def predict_batch(self, input_ids, attention_mask, return_logits: bool = False):
+        """Make predictions for a batch of sequences"""
+        return self._run(input_ids, attention_mask, return_logits)
+
+
+class ONNXBERTPredictor(BERTPredictor):
+    """
+    BERTPredictor backed by an exported ONNX model (see scripts/export_onnx.py)
+
+    If no export exists yet, one is created from the trained PyTorch weights
+    on first load.
+    """
+
+    def __init__(self, onnx_path=None, config_path=None):
+        self.onnx_path = onnx_path or DEFAULT_ONNX_PATH
+        super().__init__(config_path=config_path)
+
+        # ONNX Runtime consumes host numpy arrays; keep tokenized inputs on CPU
+        self.device = torch.device('cpu')
+
+    def _load_model(self, model_path):
+        """Create the ONNX Runtime session, exporting the .pth weights first if needed"""
+        if not os.path.exists(self.onnx_path):
+            print(f"[BERT] No ONNX model at {self.onnx_path}, exporting from {model_path}")
+            export_onnx(BERTPredictor(model_path, precision='fp32', compile_model=False), self.onnx_path)
+
+        model = ONNXMalwareBERT(self.onnx_path)
+        print(f"[BERT] ONNX model loaded from: {self.onnx_path} ({model.session.get_providers()[0]})")
+        return model
+
 
 # Singleton instance
 _predictor_instance = None
 
 
 def get_predictor() -> BERTPredictor:
-    """Get or create predictor instance (singleton)"""
+    """
+    Get or create predictor instance (singleton)
+
+    ML_API_BACKEND selects the runtime: 'onnx' (exporting the model on first
+    use if needed), 'torch', or 'auto' (default), which uses ONNX Runtime when
+    it is installed and an exported model exists.
+    """
     global _predictor_instance
     if _predictor_instance is None:
-        _predictor_instance = BERTPredictor()
+        backend = os.environ.get('ML_API_BACKEND', 'auto').lower()
+        use_onnx = backend == 'onnx' or (
+            backend == 'auto' and ort is not None and os.path.exists(DEFAULT_ONNX_PATH)
+        )
+        _predictor_instance = ONNXBERTPredictor() if use_onnx else BERTPredictor()
     return _predictor_instance
 
 
@@ -3,9 +3,49 @@ BERT-based Malware Classifier
 Uses DistilBERT for efficient shell script classification
 """
 
+import copy
+import functools
+import numpy as np
 import torch
 import torch.nn as nn
-from transformers import DistilBertModel, DistilBertTokenizer
+from typing import Optional
+from transformers import DistilBertConfig, DistilBertModel, DistilBertTokenizerFast
+
+# Allow TF32 tensor cores for fp32 matmuls on Ampere+ GPUs
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.benchmark = True
+
+
+@functools.lru_cache(maxsize=1)
+def _autocast_dtype() -> torch.dtype:
+    """Reduced precision used for CUDA autocast: bf16 where supported, else fp16"""
+    if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+        return torch.bfloat16
+    return torch.float16
+
+
+def _inference_autocast(device: torch.device):
+    """Mixed-precision autocast for inference (enabled on CUDA only)"""
+    return torch.autocast(device_type=device.type, dtype=_autocast_dtype(), enabled=device.type == 'cuda')
+
+
+@functools.lru_cache(maxsize=4)
+def _get_backbone_config(pretrained_model: str) -> DistilBertConfig:
+    """DistilBERT architecture config, read from disk once per process"""
+    return DistilBertConfig.from_pretrained(pretrained_model)
+
+
+def _build_backbone(pretrained_model: str, pretrained_weights: bool) -> DistilBertModel:
+    """
+    DistilBERT encoder owned by one MalwareBERT
+
+    Only the small config is cached, so the process never keeps a spare copy
+    of the weights. Without pretrained_weights the encoder is built from the
+    config alone, for callers that load a full checkpoint over it anyway.
+    """
+    if pretrained_weights:
+        return DistilBertModel.from_pretrained(pretrained_model)
+    return DistilBertModel(copy.deepcopy(_get_backbone_config(pretrained_model)))
 
 
 class MalwareBERT(nn.Module):
@@ -23,12 +63,14 @@ class MalwareBERT(nn.Module):
         pretrained_model: str = 'distilbert-base-uncased',
         num_classes: int = 2,
         dropout: float = 0.3,
-        freeze_bert: bool = False
+        freeze_bert: bool = False,
+        pretrained_weights: bool = True
     ):
         super(MalwareBERT, self).__init__()
 
-        # Load pre-trained DistilBERT
-        self.bert = DistilBertModel.from_pretrained(pretrained_model)
+        # DistilBERT encoder; pass pretrained_weights=False when a trained
+        # checkpoint will be loaded over it, to skip reading the pre-trained weights
+        self.bert = _build_backbone(pretrained_model, pretrained_weights)
 
         # Freeze BERT weights if specified (for faster training)
         if freeze_bert:
@@ -56,7 +98,15 @@ class MalwareBERT(nn.Module):
         Returns:
             logits: Classification logits [batch_size, num_classes]
         """
+        return self.classify(self.encode(input_ids, attention_mask))
 
+    def encode(self, input_ids, attention_mask):
+        """
+        Run the DistilBERT encoder
+
+        Returns:
+            [CLS] token representation [batch_size, bert_dim]
+        """
         # Get BERT embeddings
         outputs = self.bert(
             input_ids=input_ids,
@@ -64,9 +114,15 @@ class MalwareBERT(nn.Module):
         )
 
         # Use [CLS] token representation (first token)
-        cls_output = outputs.last_hidden_state[:, 0, :]  # [batch_size, bert_dim]
+        return outputs.last_hidden_state[:, 0, :]  # [batch_size, bert_dim]
 
-        # Classification head
+    def classify(self, cls_output):
+        """
+        Classification head on top of [CLS] embeddings
+
+        Returns:
+            logits: Classification logits [batch_size, num_classes]
+        """
         x = self.dropout(cls_output)
         x = self.fc1(x)
         x = self.relu(x)
@@ -75,32 +131,74 @@ class MalwareBERT(nn.Module):
 
         return logits
 
-    def predict(self, input_ids, attention_mask):
+    def predict(self, input_ids, attention_mask, return_logits: bool = False):
         """
         Make prediction with probabilities
 
+        The caller is expected to have put the model in eval mode.
+
+        Args:
+            return_logits: Also include the raw logits in the result
+
         Returns:
             dict with prediction results
         """
-        self.eval()
-        with torch.no_grad():
-            logits = self.forward(input_ids, attention_mask)
-            probs = torch.softmax(logits, dim=1)
-
-            predicted_class = torch.argmax(probs, dim=1).item()
-            confidence = probs[0, predicted_class].item()
-
-            # Probability of malicious class (class 1)
-            prob_malicious = probs[0, 1].item()
-
-            return {
-                'predicted_class': predicted_class,
-                'is_malicious': predicted_class == 1,
-                'confidence': confidence,
-                'prob_benign': probs[0, 0].item(),
-                'prob_malicious': prob_malicious,
-                'logits': logits[0].cpu().numpy().tolist()
-            }
+        # One device-to-host copy instead of an .item() sync per field
+        return self.predict_batch(input_ids, attention_mask, return_logits)[0]
+
+    def predict_batch(self, input_ids, attention_mask, return_logits: bool = False):
+        """
+        Make predictions for a batch of sequences in a single forward pass
+
+        Args:
+            input_ids: Token IDs [batch_size, seq_len]
+            attention_mask: Attention mask [batch_size, seq_len]
+            return_logits: Also include the raw logits in each result
+
+        Returns:
+            List of prediction dicts, one per row
+        """
+        with torch.inference_mode(), _inference_autocast(input_ids.device):
+            # Upcast so softmax is stable when the model runs in reduced precision
+            logits = self.forward(input_ids, attention_mask).float()
+            return self._predictions(logits, return_logits)
+
+    def embed(self, input_ids, attention_mask):
+        """
+        [CLS] embeddings for a batch of sequences (inference only)
+
+        Returns:
+            Tensor [batch_size, bert_dim]
+        """
+        with torch.inference_mode(), _inference_autocast(input_ids.device):
+            return self.encode(input_ids, attention_mask)
+
+    def predict_embeddings(self, cls_embeddings, return_logits: bool = False):
+        """
+        Make predictions from precomputed [CLS] embeddings, skipping the encoder
+
+        Args:
+            cls_embeddings: List of [bert_dim] tensors (e.g. rows returned by embed)
+            return_logits: Also include the raw logits in each result
+
+        Returns:
+            List of prediction dicts, one per embedding
+        """
+        with torch.inference_mode():
+            stacked = torch.stack(cls_embeddings)
+            with _inference_autocast(stacked.device):
+                logits = self.classify(stacked).float()
+            return self._predictions(logits, return_logits)
+
+    def _predictions(self, logits, return_logits: bool = False):
+        """Prediction dicts from fp32 logits"""
+        probs = torch.softmax(logits, dim=1)
+
+        # Single device-to-host copy (one sync) for the whole batch; logits only if asked for
+        if not return_logits:
+            return predictions_from_logits(None, probs.cpu().numpy())
+        host_logits, host_probs = torch.stack((logits, probs)).cpu().numpy()
+        return predictions_from_logits(host_logits, host_probs)
 
     def count_parameters(self):
         """Count trainable and total parameters"""
@@ -113,9 +211,41 @@ class MalwareBERT(nn.Module):
         }
 
 
+def predictions_from_logits(logits: Optional[np.ndarray], probs: np.ndarray) -> list:
+    """
+    Build per-row prediction dicts from host-side logits and probabilities
+
+    Shared by the PyTorch and ONNX Runtime inference paths so both return
+    identical result structures.
+
+    Args:
+        logits: Classification logits [batch_size, num_classes], or None to
+            leave 'logits' out of the results
+        probs: Softmax probabilities [batch_size, num_classes]
+
+    Returns:
+        List of prediction dicts, one per row
+    """
+    results = []
+    for idx, row_probs in enumerate(probs):
+        predicted_class = int(np.argmax(row_probs))
+        result = {
+            'predicted_class': predicted_class,
+            'is_malicious': predicted_class == 1,
+            'confidence': float(row_probs[predicted_class]),
+            'prob_benign': float(row_probs[0]),
+            'prob_malicious': float(row_probs[1])
+        }
+        if logits is not None:
+            result['logits'] = logits[idx].tolist()
+        results.append(result)
+    return results
+
+
+@functools.lru_cache(maxsize=4)
 def get_tokenizer(model_name: str = 'distilbert-base-uncased'):
-    """Get BERT tokenizer"""
-    return DistilBertTokenizer.from_pretrained(model_name)
+    """Get BERT tokenizer (Rust-backed fast tokenizer, batches natively)"""
+    return DistilBertTokenizerFast.from_pretrained(model_name)
 
 
 def prepare_input(text: str, tokenizer, max_length: int = 512, device: str = 'cpu'):
@@ -141,7 +271,15 @@ def prepare_input(text: str, tokenizer, max_length: int = 512, device: str = 'cp
         return_tensors='pt'
     )
 
-    input_ids = encoded['input_ids'].to(device)
-    attention_mask = encoded['attention_mask'].to(device)
+    input_ids = encoded['input_ids']
+    attention_mask = encoded['attention_mask']
+
+    # Pinned host memory lets the copy run asynchronously on CUDA
+    if torch.device(device).type == 'cuda':
+        input_ids = input_ids.pin_memory()
+        attention_mask = attention_mask.pin_memory()
+
+    input_ids = input_ids.to(device, non_blocking=True)
+    attention_mask = attention_mask.to(device, non_blocking=True)
 
     return input_ids, attention_mask
@@ -4,7 +4,47 @@ Converts raw shell scripts into BERT-compatible text sequences
 """
 
 import re
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+
+@dataclass
+class ScriptFeatures:
+    """Semantic features extracted from a shell script"""
+
+    __slots__ = (
+        'commands', 'dangerous_commands', 'urls', 'ips', 'base64_count',
+        'obfuscation_score', 'suspicious_patterns', 'total_commands', 'dangerous_ratio'
+    )
+
+    commands: List[str]
+    dangerous_commands: List[str]
+    urls: List[str]
+    ips: List[str]
+    base64_count: int
+    obfuscation_score: float
+    suspicious_patterns: List[str]
+    total_commands: int
+    dangerous_ratio: float
+
+    @property
+    def has_base64(self) -> bool:
+        return self.base64_count > 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable form used in API responses"""
+        return {
+            'commands': self.commands,
+            'dangerous_commands': self.dangerous_commands,
+            'urls': self.urls,
+            'ips': self.ips,
+            'has_base64': self.has_base64,
+            'base64_count': self.base64_count,
+            'obfuscation_score': self.obfuscation_score,
+            'suspicious_patterns': self.suspicious_patterns,
+            'total_commands': self.total_commands,
+            'dangerous_ratio': self.dangerous_ratio
+        }
 
 
 class ShellScriptPreprocessor:
@@ -36,7 +76,35 @@ class ShellScriptPreprocessor:
             r'`[^`]+`',  # backticks
         ]
 
-    def extract_features(self, script: str) -> Dict[str, any]:
+        # Precompiled patterns (the re module cache is bounded and evicts under load)
+        self._re_comment = re.compile(r'#[^\n]*')
+        # First word of each segment between ; newline | and & separators
+        self._re_command = re.compile(r'(?:^|(?<=[;\n\|&]))\s*(\w+)')
+        self._re_url = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+        # Dotted quads; only those with every octet <= 255 are captured. Invalid candidates
+        # still match (uncaptured) so they consume their text, as a post-filter would
+        octet = r'(?:25[0-5]|2[0-4][0-9]|[01]?[0-9]?[0-9])'
+        self._re_ip = re.compile(
+            rf'\b(?:((?:{octet}\.){{3}}{octet})|(?:[0-9]{{1,3}}\.){{3}}[0-9]{{1,3}})\b'
+        )
+        self._re_b64 = re.compile(r'[A-Za-z0-9+/]{20,}={0,2}')
+        self._re_escape = re.compile(r'\\[^n\s]')
+        self._re_indir = re.compile(r'\$\{[^}]+\}')
+        self._re_evalexec = re.compile(r'\beval\b|\bexec\b')
+        self._re_b64_word = re.compile(r'base64', re.IGNORECASE)
+        self._re_subs = re.compile(r'sed|awk|tr|cut')
+
+        # Suspicious patterns are scanned in one fused alternation, except those whose
+        # matches overlap others: '/dev/null' (also inside '> /dev/null') and backtick
+        # spans (which can contain any other pattern) keep their own scans
+        overlapping = {r'/dev/null', r'`[^`]+`'}
+        fused = [p for p in self.suspicious_patterns if p not in overlapping]
+        self._re_suspicious_union = re.compile('|'.join(f'(?:{p})' for p in fused), re.IGNORECASE)
+        self._suspicious_separate = [
+            re.compile(p, re.IGNORECASE) for p in self.suspicious_patterns if p in overlapping
+        ]
+
+    def extract_features(self, script: str) -> ScriptFeatures:
         """Extract semantic features from script"""
 
         # Clean script
@@ -46,33 +114,30 @@ class ShellScriptPreprocessor:
         commands = self._extract_commands(script_clean)
         urls = self._extract_urls(script_clean)
         ips = self._extract_ips(script_clean)
-        base64_content = self._find_base64(script_clean)
+        base64_count = self._count_base64(script_clean)
         obfuscation = self._detect_obfuscation(script_clean)
 
         # Suspicious pattern matches
-        suspicious_matches = []
-        for pattern in self.suspicious_patterns:
-            matches = re.findall(pattern, script_clean, re.IGNORECASE)
-            if matches:
-                suspicious_matches.extend(matches)
+        suspicious_matches = self._re_suspicious_union.findall(script_clean)
+        for pattern in self._suspicious_separate:
+            suspicious_matches.extend(pattern.findall(script_clean))
 
         # Command analysis
         dangerous_cmds = [cmd for cmd in commands if cmd.lower() in self.dangerous_commands]
 
-        return {
-            'commands': commands,
-            'dangerous_commands': dangerous_cmds,
-            'urls': urls,
-            'ips': ips,
-            'has_base64': len(base64_content) > 0,
-            'base64_count': len(base64_content),
-            'obfuscation_score': obfuscation,
-            'suspicious_patterns': suspicious_matches,
-            'total_commands': len(commands),
-            'dangerous_ratio': len(dangerous_cmds) / max(len(commands), 1)
-        }
-
-    def prepare_for_bert(self, script: str) -> Tuple[str, Dict]:
+        return ScriptFeatures(
+            commands=commands,
+            dangerous_commands=dangerous_cmds,
+            urls=urls,
+            ips=ips,
+            base64_count=base64_count,
+            obfuscation_score=obfuscation,
+            suspicious_patterns=suspicious_matches,
+            total_commands=len(commands),
+            dangerous_ratio=len(dangerous_cmds) / max(len(commands), 1)
+        )
+
+    def prepare_for_bert(self, script: str) -> Tuple[str, ScriptFeatures]:
         """
         Convert script to BERT-friendly text format
 
@@ -88,36 +153,36 @@ class ShellScriptPreprocessor:
         text_parts = []
 
         # Add command sequence
-        if features['commands']:
-            cmd_text = ' '.join(features['commands'][:20])  # First 20 commands
+        if features.commands:
+            cmd_text = ' '.join(features.commands[:20])  # First 20 commands
             text_parts.append(f"commands: {cmd_text}")
 
         # Add dangerous commands
-        if features['dangerous_commands']:
-            danger_text = ' '.join(features['dangerous_commands'])
+        if features.dangerous_commands:
+            danger_text = ' '.join(features.dangerous_commands)
             text_parts.append(f"dangerous: {danger_text}")
 
         # Add URLs
-        if features['urls']:
-            url_text = ' '.join(features['urls'])
+        if features.urls:
+            url_text = ' '.join(features.urls)
             text_parts.append(f"urls: {url_text}")
 
         # Add IPs
-        if features['ips']:
-            ip_text = ' '.join(features['ips'])
+        if features.ips:
+            ip_text = ' '.join(features.ips)
             text_parts.append(f"ips: {ip_text}")
 
         # Add suspicious patterns
-        if features['suspicious_patterns']:
-            pattern_text = ' '.join(set(features['suspicious_patterns']))
+        if features.suspicious_patterns:
+            pattern_text = ' '.join(set(features.suspicious_patterns))
             text_parts.append(f"suspicious: {pattern_text}")
 
         # Add metadata
-        metadata = f"total_commands: {features['total_commands']} dangerous_ratio: {features['dangerous_ratio']:.2f}"
-        if features['has_base64']:
-            metadata += f" base64_encoded: {features['base64_count']}"
-        if features['obfuscation_score'] > 0.3:
-            metadata += f" obfuscated: {features['obfuscation_score']:.2f}"
+        metadata = f"total_commands: {features.total_commands} dangerous_ratio: {features.dangerous_ratio:.2f}"
+        if features.has_base64:
+            metadata += f" base64_encoded: {features.base64_count}"
+        if features.obfuscation_score > 0.3:
+            metadata += f" obfuscated: {features.obfuscation_score:.2f}"
 
         text_parts.append(metadata)
 
@@ -132,57 +197,50 @@ class ShellScriptPreprocessor:
 
     def _clean_script(self, script: str) -> str:
         """Clean script content"""
-        # Remove comments but keep the script structure
-        lines = []
-        for line in script.split('\n'):
-            # Remove inline comments but keep command
-            line = re.sub(r'#.*$', '', line)
-            line = line.strip()
-            if line:
-                lines.append(line)
-        return '\n'.join(lines)
+        # Remove comments (inline ones too, keeping the command) across the whole
+        # buffer at once, then drop blank lines but keep the script structure
+        stripped = (line.strip() for line in self._re_comment.sub('', script).split('\n'))
+        return '\n'.join(line for line in stripped if line)
 
     def _extract_commands(self, script: str) -> List[str]:
         """Extract command names from script"""
-        commands = []
-
         # Simple command extraction (first word after pipes, &&, ||, semicolons, newlines)
-        tokens = re.split(r'[;\n\|&]+', script)
-
-        for token in tokens:
-            token = token.strip()
-            if token:
-                # Get first word (command name)
-                match = re.match(r'^(\w+)', token)
-                if match:
-                    commands.append(match.group(1))
-
-        return commands
+        return self._re_command.findall(script)
 
     def _extract_urls(self, script: str) -> List[str]:
         """Extract URLs from script"""
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        urls = re.findall(url_pattern, script)
+        urls = self._re_url.findall(script)
         return urls
 
     def _extract_ips(self, script: str) -> List[str]:
         """Extract IP addresses"""
-        ip_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
-        ips = re.findall(ip_pattern, script)
-        # Filter out invalid IPs
-        valid_ips = []
-        for ip in ips:
-            parts = ip.split('.')
-            if all(0 <= int(p) <= 255 for p in parts):
-                valid_ips.append(ip)
-        return valid_ips
-
-    def _find_base64(self, script: str) -> List[str]:
-        """Find potential base64 encoded content"""
+        # Octet ranges are validated by the pattern; invalid candidates capture ''
+        return [ip for ip in self._re_ip.findall(script) if ip]
+
+    def _count_base64(self, script: str) -> int:
+        """Count potential base64 encoded strings"""
         # Look for long alphanumeric strings that might be base64
-        base64_pattern = r'[A-Za-z0-9+/]{20,}={0,2}'
-        matches = re.findall(base64_pattern, script)
-        return matches
+        return self._count_up_to(self._re_b64, script)
+
+    @staticmethod
+    def _count_up_to(regex, text: str, limit: int = None) -> int:
+        """
+        Count non-overlapping matches without building a list
+
+        Args:
+            regex: Compiled pattern
+            text: Text to scan
+            limit: Stop scanning once this many matches are found (None scans everything)
+
+        Returns:
+            Number of matches, capped at limit
+        """
+        count = 0
+        for _ in regex.finditer(text):
+            count += 1
+            if count == limit:
+                break
+        return count
 
     def _detect_obfuscation(self, script: str) -> float:
         """
@@ -197,25 +255,26 @@ class ShellScriptPreprocessor:
         score = 0.0
 
         # Count escape characters
-        escapes = len(re.findall(r'\\[^n\s]', script))
+        # Only the thresholds matter, so stop counting once one is passed
+        escapes = self._count_up_to(self._re_escape, script, 11)
         if escapes > 10:
             score += 0.2
 
         # Count variable indirection
-        indirection = len(re.findall(r'\$\{[^}]+\}', script))
+        indirection = self._count_up_to(self._re_indir, script, 6)
         if indirection > 5:
             score += 0.2
 
         # Check for eval/exec
-        if re.search(r'\beval\b|\bexec\b', script):
+        if self._re_evalexec.search(script):
             score += 0.3
 
         # Check for base64
-        if re.search(r'base64', script, re.IGNORECASE):
+        if self._re_b64_word.search(script):
             score += 0.2
 
         # Check for complex substitutions
-        substitutions = len(re.findall(r'sed|awk|tr|cut', script))
+        substitutions = self._count_up_to(self._re_subs, script, 4)
         if substitutions > 3:
             score += 0.1
 
@@ -5,94 +5,243 @@ Fine-tunes DistilBERT on shell script dataset with data augmentation
 
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
+from torch.nn.utils.rnn import pad_sequence
+from torch.utils.data import Dataset, DataLoader, Sampler
 from torch.optim import AdamW
 from transformers import get_linear_schedule_with_warmup
 import os
+import re
+import math
 import json
+import hashlib
+import inspect
 import random
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import sys
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from bert.model import MalwareBERT, get_tokenizer, prepare_input
+from bert.model import MalwareBERT, get_tokenizer, prepare_input, _autocast_dtype
 from bert.preprocessor import ShellScriptPreprocessor
 from bert.augmentation import augment_dataset
 
+# Allow TF32 tensor cores for the fp32 matmuls left outside autocast
+torch.set_float32_matmul_precision('high')
+
+# Digest of the preprocessing source, part of the token cache name: cached ids
+# are of prepare_for_bert output, so any preprocessor change invalidates them
+with open(inspect.getfile(ShellScriptPreprocessor), 'rb') as _f:
+    PREPROCESSOR_VERSION = hashlib.sha256(_f.read()).hexdigest()[:12]
+
+
+def _progress(iterable, desc):
+    """Progress bar throttled to ~1 redraw/s (and none when stderr isn't a terminal)"""
+    return tqdm(iterable, desc=desc, mininterval=1.0, miniters=50, disable=not sys.stderr.isatty())
+
+
+def _autocast(device):
+    """Mixed-precision autocast for training/evaluation (enabled on CUDA only)"""
+    return torch.autocast(device_type=device.type, dtype=_autocast_dtype(), enabled=device.type == 'cuda')
+
 
 class ShellScriptDataset(Dataset):
-    """Dataset for shell scripts"""
+    """
+    Dataset for shell scripts
+
+    Scripts are preprocessed and tokenized once here, so indexing only
+    returns pre-built tensors instead of re-tokenizing every epoch.
+    Sequences are stored unpadded; use collate as the DataLoader
+    collate_fn to pad each batch to its own longest sequence.
 
-    def __init__(self, scripts, labels, tokenizer, preprocessor, max_length=512):
+    token_cache maps script content hashes to token ids. Pass the same dict
+    (see load_token_cache) to every dataset of a run: scripts already in it,
+    from disk or repeated by augmentation, skip preprocessing and
+    tokenization entirely, and new ones are added to it.
+    """
+
+    def __init__(self, scripts, labels, tokenizer, preprocessor, max_length=512, token_cache=None):
         self.scripts = scripts
-        self.labels = labels
+        self.labels = torch.as_tensor(labels, dtype=torch.long)
         self.tokenizer = tokenizer
         self.preprocessor = preprocessor
         self.max_length = max_length
+        self.pad_token_id = tokenizer.pad_token_id or 0
+
+        cache = {} if token_cache is None else token_cache
+
+        keys = [hashlib.blake2b(script.encode('utf-8', 'ignore'), digest_size=16).digest() for script in scripts]
+        missing = list(dict.fromkeys(key for key in keys if key not in cache))
+
+        if missing:
+            # Preprocess each distinct uncached script to BERT-friendly format
+            script_by_key = dict(zip(keys, scripts))
+            texts = [self.preprocessor.prepare_for_bert(script_by_key[key])[0] for key in missing]
+
+            # Tokenize them in one batched call (fast tokenizer, no padding)
+            encoded = self.tokenizer(
+                texts,
+                add_special_tokens=True,
+                max_length=self.max_length,
+                truncation=True,
+                return_attention_mask=False
+            )
+            for key, ids in zip(missing, encoded['input_ids']):
+                cache[key] = torch.tensor(ids, dtype=torch.long)
+
+        print(f"[Dataset] {len(scripts)} scripts, {len(missing)} tokenized, "
+              f"{len(scripts) - len(missing)} from cache or duplicates")
+        self.keys = keys
+        self.tokenized = len(missing)
+        self.input_ids = [cache[key] for key in keys]
+        self.lengths = [len(ids) for ids in self.input_ids]
 
     def __len__(self):
         return len(self.scripts)
 
     def __getitem__(self, idx):
-        script = self.scripts[idx]
-        label = self.labels[idx]
-
-        # Preprocess script to BERT-friendly format
-        text, features = self.preprocessor.prepare_for_bert(script)
-
-        # Tokenize
-        encoded = self.tokenizer.encode_plus(
-            text,
-            add_special_tokens=True,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_attention_mask=True,
-            return_tensors='pt'
-        )
+        return {
+            'input_ids': self.input_ids[idx],
+            'label': self.labels[idx]
+        }
+
+    def collate(self, batch):
+        """Stack items into a batch padded to its longest sequence"""
+        input_ids = pad_sequence([item['input_ids'] for item in batch],
+                                 batch_first=True, padding_value=self.pad_token_id)
+
+        # Real tokens are a prefix of each row
+        lengths = torch.tensor([len(item['input_ids']) for item in batch])
+        attention_mask = (torch.arange(input_ids.size(1)) < lengths[:, None]).long()
 
         return {
-            'input_ids': encoded['input_ids'].flatten(),
-            'attention_mask': encoded['attention_mask'].flatten(),
-            'label': torch.tensor(label, dtype=torch.long)
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'label': torch.stack([item['label'] for item in batch])
         }
 
 
-def load_dataset(data_dir, shuffle=True):
-    """Load shell scripts from directory"""
+def token_cache_path(cache_dir, tokenizer, preprocessor, max_length):
+    """
+    Token cache file for these settings
+
+    Tokenizer, length settings and the preprocessor source digest are part of
+    the name, so changing any of them invalidates the cache.
+    """
+    tokenizer_name = re.sub(r'[^\w.-]', '_', getattr(tokenizer, 'name_or_path', 'tokenizer'))
+    return os.path.join(
+        cache_dir,
+        f"bert_tokens_{tokenizer_name}_{max_length}_{preprocessor.max_length}_{PREPROCESSOR_VERSION}.pt"
+    )
+
+
+def load_token_cache(cache_path):
+    """Token ids cached by an earlier run, or an empty cache"""
+    return torch.load(cache_path) if os.path.exists(cache_path) else {}
+
+
+def save_token_cache(cache_path, token_cache, datasets):
+    """
+    Write the token cache once per run, keeping only the scripts these datasets use
+
+    Entries of scripts no longer in the data are dropped, so the file does not
+    grow across runs. Nothing is written when the cache is unchanged.
+    """
+    used = set().union(*(dataset.keys for dataset in datasets))
+    if not any(dataset.tokenized for dataset in datasets) and len(used) == len(token_cache):
+        return
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    torch.save({key: token_cache[key] for key in used}, cache_path)
+
+
+def _read_text(filepath):
+    """Read one script, or None if it is empty or unreadable"""
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            script = f.read()
+        return script if script.strip() else None  # Skip empty files
+    except Exception as e:
+        print(f"[WARN] Failed to load {filepath}: {e}")
+        return None
+
+
+class BucketBatchSampler(Sampler):
+    """
+    Batch sampler that groups sequences of similar length
+
+    With shuffling, indices are shuffled, split into pools of
+    batch_size * bucket_multiplier, each pool is sorted by length and cut
+    into batches, and the batch order is shuffled again. Batches stay
+    random from epoch to epoch, but each pads only to a near-uniform length.
+    Without shuffling, all indices are sorted as one bucket (for evaluation).
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, drop_last=False, bucket_multiplier=8, seed=42):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.pool_size = batch_size * bucket_multiplier
+        self._rng = random.Random(seed)
+
+    def __iter__(self):
+        indices = list(range(len(self.lengths)))
+
+        if self.shuffle:
+            self._rng.shuffle(indices)
+            pools = [indices[start:start + self.pool_size] for start in range(0, len(indices), self.pool_size)]
+        else:
+            pools = [indices]
+
+        batches = []
+        for pool in pools:
+            pool.sort(key=self.lengths.__getitem__)
+            batches.extend(pool[start:start + self.batch_size] for start in range(0, len(pool), self.batch_size))
+
+        if self.drop_last:
+            batches = [batch for batch in batches if len(batch) == self.batch_size]
+        if self.shuffle:
+            self._rng.shuffle(batches)
+
+        return iter(batches)
+
+    def __len__(self):
+        if not self.shuffle:
+            full, rest = divmod(len(self.lengths), self.batch_size)
+            return full + (0 if self.drop_last or not rest else 1)
+
+        # Every pool but the last is a whole number of batches
+        num_batches = 0
+        for start in range(0, len(self.lengths), self.pool_size):
+            full, rest = divmod(min(self.pool_size, len(self.lengths) - start), self.batch_size)
+            num_batches += full + (0 if self.drop_last or not rest else 1)
+        return num_batches
+
+
+def load_dataset(data_dir, shuffle=True, num_workers=32):
+    """Load shell scripts from directory (files are read concurrently)"""
     scripts = []
     labels = []
 
-    # Load malicious scripts
-    malicious_dir = os.path.join(data_dir, 'malicious')
-    if os.path.exists(malicious_dir):
-        for filename in os.listdir(malicious_dir):
-            if filename.endswith('.sh'):
-                filepath = os.path.join(malicious_dir, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                        script = f.read()
-                        if script.strip():  # Skip empty files
-                            scripts.append(script)
-                            labels.append(1)  # Malicious
-                except Exception as e:
-                    print(f"[WARN] Failed to load {filepath}: {e}")
-
-    # Load benign scripts
-    benign_dir = os.path.join(data_dir, 'benign')
-    if os.path.exists(benign_dir):
-        for filename in os.listdir(benign_dir):
-            if filename.endswith('.sh'):
-                filepath = os.path.join(benign_dir, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                        script = f.read()
-                        if script.strip():  # Skip empty files
-                            scripts.append(script)
-                            labels.append(0)  # Benign
-                except Exception as e:
-                    print(f"[WARN] Failed to load {filepath}: {e}")
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        # Malicious scripts are labelled 1, benign scripts 0
+        for subdir, label in (('malicious', 1), ('benign', 0)):
+            class_dir = os.path.join(data_dir, subdir)
+            if not os.path.exists(class_dir):
+                continue
+
+            with os.scandir(class_dir) as entries:
+                paths = [entry.path for entry in entries if entry.name.endswith('.sh')]
+
+            for script in pool.map(_read_text, paths):
+                if script is not None:
+                    scripts.append(script)
+                    labels.append(label)
 
     print(f"Loaded {len(scripts)} scripts ({sum(labels)} malicious, {len(labels) - sum(labels)} benign)")
 
@@ -106,36 +255,53 @@ def load_dataset(data_dir, shuffle=True):
     return scripts, labels
 
 
-def train_epoch(model, dataloader, optimizer, scheduler, device, criterion):
-    """Train for one epoch"""
+def train_epoch(model, dataloader, optimizer, scheduler, device, criterion, scaler=None, grad_accum_steps=1):
+    """
+    Train for one epoch
+
+    Args:
+        scaler: GradScaler for fp16 autocast (a disabled scaler is used if None)
+        grad_accum_steps: Batches whose gradients are summed per optimizer step
+    """
+    if scaler is None:
+        scaler = torch.cuda.amp.GradScaler(enabled=False)
+
     model.train()
-    total_loss = 0
-    correct = 0
+    # Accumulated on the device so the loop never waits on a .item() sync
+    total_loss = torch.zeros((), device=device)
+    correct = torch.zeros((), dtype=torch.long, device=device)
     total = 0
 
-    for batch in tqdm(dataloader, desc="Training"):
-        input_ids = batch['input_ids'].to(device)
-        attention_mask = batch['attention_mask'].to(device)
-        labels = batch['label'].to(device)
+    optimizer.zero_grad(set_to_none=True)
 
-        optimizer.zero_grad()
+    for step, batch in enumerate(_progress(dataloader, "Training"), 1):
+        input_ids = batch['input_ids'].to(device, non_blocking=True)
+        attention_mask = batch['attention_mask'].to(device, non_blocking=True)
+        labels = batch['label'].to(device, non_blocking=True)
 
-        logits = model(input_ids, attention_mask)
-        loss = criterion(logits, labels)
+        with _autocast(device):
+            logits = model(input_ids, attention_mask)
+            loss = criterion(logits, labels)
 
-        loss.backward()
-        optimizer.step()
-        scheduler.step()
+        # Loss scaling keeps fp16 gradients from underflowing (no-op when disabled);
+        # dividing by grad_accum_steps makes the summed gradient a mean over the group
+        scaler.scale(loss / grad_accum_steps).backward()
 
-        total_loss += loss.item()
+        if step % grad_accum_steps == 0 or step == len(dataloader):
+            scaler.step(optimizer)
+            scaler.update()
+            scheduler.step()
+            optimizer.zero_grad(set_to_none=True)
+
+        total_loss += loss.detach().float()
 
         # Calculate accuracy
         predictions = torch.argmax(logits, dim=1)
-        correct += (predictions == labels).sum().item()
+        correct += (predictions == labels).sum()
         total += labels.size(0)
 
-    avg_loss = total_loss / len(dataloader)
-    accuracy = correct / total
+    avg_loss = total_loss.item() / len(dataloader)
+    accuracy = correct.item() / total
 
     return avg_loss, accuracy
 
@@ -143,31 +309,103 @@ def train_epoch(model, dataloader, optimizer, scheduler, device, criterion):
 def evaluate(model, dataloader, device, criterion):
     """Evaluate model"""
     model.eval()
-    total_loss = 0
-    correct = 0
+    # Accumulated on the device so the loop never waits on a .item() sync
+    total_loss = torch.zeros((), device=device)
+    correct = torch.zeros((), dtype=torch.long, device=device)
     total = 0
 
-    with torch.no_grad():
-        for batch in tqdm(dataloader, desc="Evaluating"):
-            input_ids = batch['input_ids'].to(device)
-            attention_mask = batch['attention_mask'].to(device)
-            labels = batch['label'].to(device)
+    with torch.inference_mode():
+        for batch in _progress(dataloader, "Evaluating"):
+            input_ids = batch['input_ids'].to(device, non_blocking=True)
+            attention_mask = batch['attention_mask'].to(device, non_blocking=True)
+            labels = batch['label'].to(device, non_blocking=True)
 
-            logits = model(input_ids, attention_mask)
-            loss = criterion(logits, labels)
+            with _autocast(device):
+                logits = model(input_ids, attention_mask)
+                loss = criterion(logits, labels)
 
-            total_loss += loss.item()
+            total_loss += loss.float()
 
             predictions = torch.argmax(logits, dim=1)
-            correct += (predictions == labels).sum().item()
+            correct += (predictions == labels).sum()
             total += labels.size(0)
 
-    avg_loss = total_loss / len(dataloader)
-    accuracy = correct / total
+    avg_loss = total_loss.item() / len(dataloader)
+    accuracy = correct.item() / total
 
     return avg_loss, accuracy
 
 
+def freeze_lower_layers(model, num_layers):
+    """
+    Freeze the DistilBERT embeddings and the lowest num_layers transformer layers
+
+    The embeddings are frozen too; otherwise gradients would still have to
+    flow back through the frozen layers to reach them.
+    """
+    if num_layers <= 0:
+        return
+
+    frozen = ('embeddings.',) + tuple(f'transformer.layer.{i}.' for i in range(num_layers))
+    for name, param in model.bert.named_parameters():
+        if name.startswith(frozen):
+            param.requires_grad_(False)
+
+
+def layerwise_param_groups(model, learning_rate, decay):
+    """
+    AdamW parameter groups with layer-wise learning-rate decay
+
+    The classification head and top transformer layer train at learning_rate;
+    each layer below gets `decay` times the rate of the one above it, and
+    the embeddings the rate below the lowest layer. Frozen parameters are
+    left out.
+    """
+    num_layers = model.bert.config.n_layers
+    groups = {}
+
+    for name, param in model.named_parameters():
+        if not param.requires_grad:
+            continue
+
+        if name.startswith('bert.transformer.layer.'):
+            depth = num_layers - 1 - int(name.split('.')[3])
+        elif name.startswith('bert.'):
+            depth = num_layers  # Embeddings
+        else:
+            depth = 0  # Classification head
+
+        groups.setdefault(depth, []).append(param)
+
+    return [
+        {'params': params, 'lr': learning_rate * decay ** depth}
+        for depth, params in sorted(groups.items())
+    ]
+
+
+def save_checkpoint(state_dict, model_config, model_path, config_path):
+    """
+    Write model weights and config atomically (temp file + os.replace)
+
+    Runs on train_model's background save thread, so a reader never sees a
+    half-written checkpoint.
+    """
+    tmp_path = model_path + '.tmp'
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, model_path)
+
+    tmp_path = config_path + '.tmp'
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(model_config, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(tmp_path, 'w') as f:
+            json.dump(model_config, f, indent=2)
+    os.replace(tmp_path, config_path)
+
+    print(f"  Model saved to: {model_path}")
+
+
 def train_model(config=None):
     """Main training function"""
 
@@ -179,8 +417,11 @@ def train_model(config=None):
             'epochs': 20,              # More epochs for better convergence
             'learning_rate': 1e-5,     # Lower LR for stability
             'dropout': 0.5,            # Higher dropout to prevent overfitting
-            'freeze_bert': False,      # Fine-tune all layers
-            'warmup_steps': 50,        # Less warmup for small dataset
+            'freeze_bert': False,      # Fine-tune the BERT encoder...
+            'freeze_layers': 4,        # ...except embeddings + the lowest 4 transformer layers
+            'layer_lr_decay': 0.9,     # LR multiplier per layer below the top one
+            'warmup_steps': 50,        # Less warmup for small dataset (in batches)
+            'grad_accum_steps': 8,     # Effective batch of 32 from batches of 4
             'augmentation_factor': 3,  # 3x data augmentation
             'weight_decay': 0.01,      # L2 regularization
         }
@@ -227,16 +468,40 @@ def train_model(config=None):
     tokenizer = get_tokenizer(config['pretrained_model'])
     preprocessor = ShellScriptPreprocessor(max_length=config['max_length'])
 
-    # Create datasets
+    # Create datasets (token ids are cached on disk across runs)
+    cache_dir = os.path.join(os.path.dirname(__file__), '../../datasets/processed')
+    cache_path = token_cache_path(cache_dir, tokenizer, preprocessor, config['max_length'])
+    token_cache = load_token_cache(cache_path)
     train_dataset = ShellScriptDataset(
-        train_scripts, train_labels, tokenizer, preprocessor, config['max_length']
+        train_scripts, train_labels, tokenizer, preprocessor, config['max_length'], token_cache
     )
     val_dataset = ShellScriptDataset(
-        val_scripts, val_labels, tokenizer, preprocessor, config['max_length']
+        val_scripts, val_labels, tokenizer, preprocessor, config['max_length'], token_cache
     )
+    save_token_cache(cache_path, token_cache, (train_dataset, val_dataset))
+
+    # Batches group scripts of similar length and are padded to their own longest
+    # sequence rather than max_length. Worker processes collate ahead of the GPU;
+    # pinned batches copy asynchronously
+    num_workers = config.get('num_workers', min(8, os.cpu_count() or 1))
+    loader_kwargs = {
+        'num_workers': num_workers,
+        'pin_memory': device.type == 'cuda',
+    }
+    if num_workers > 0:
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=4)
+
+    train_sampler = BucketBatchSampler(
+        train_dataset.lengths, config['batch_size'], shuffle=True,
+        # Drop ragged batches, unless the dataset fits in a single one
+        drop_last=len(train_dataset) > config['batch_size']
+    )
+    val_sampler = BucketBatchSampler(val_dataset.lengths, config['batch_size'], shuffle=False)
 
-    train_loader = DataLoader(train_dataset, batch_size=config['batch_size'], shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=config['batch_size'], shuffle=False)
+    train_loader = DataLoader(
+        train_dataset, batch_sampler=train_sampler, collate_fn=train_dataset.collate, **loader_kwargs
+    )
+    val_loader = DataLoader(val_dataset, batch_sampler=val_sampler, collate_fn=val_dataset.collate, **loader_kwargs)
 
     # Initialize model
     print("\nInitializing model...")
@@ -247,6 +512,16 @@ def train_model(config=None):
         freeze_bert=config['freeze_bert']
     ).to(device)
 
+    freeze_lower_layers(model, config.get('freeze_layers', 0))
+
+    # Compiled wrapper for the training loop; `model` stays the plain module so
+    # saved state_dict keys don't gain the compiled wrapper's prefix
+    train_forward = model
+    if config.get('compile', True) and hasattr(torch, 'compile') and device.type == 'cuda':
+        # Dynamic shapes: batches are padded to their own length (see collate)
+        train_forward = torch.compile(model, mode='max-autotune', dynamic=True)
+        print("Model compiled with torch.compile")
+
     param_info = model.count_parameters()
     print(f"\nModel Info:")
     print(f"  Architecture: MalwareBERT (DistilBERT)")
@@ -256,29 +531,45 @@ def train_model(config=None):
 
     # Optimizer and scheduler
     optimizer = AdamW(
-        model.parameters(),
+        layerwise_param_groups(model, config['learning_rate'], config.get('layer_lr_decay', 1.0)),
         lr=config['learning_rate'],
         weight_decay=config.get('weight_decay', 0.01)
     )
-    total_steps = len(train_loader) * config['epochs']
+    # The scheduler advances once per optimizer step, i.e. every grad_accum_steps batches
+    grad_accum_steps = max(1, config.get('grad_accum_steps', 1))
+    steps_per_epoch = math.ceil(len(train_loader) / grad_accum_steps)
+    total_steps = steps_per_epoch * config['epochs']
     scheduler = get_linear_schedule_with_warmup(
         optimizer,
-        num_warmup_steps=config['warmup_steps'],
+        num_warmup_steps=math.ceil(config['warmup_steps'] / grad_accum_steps),
         num_training_steps=total_steps
     )
 
     criterion = nn.CrossEntropyLoss()
 
+    # bf16 has fp32's range and needs no loss scaling; fp16 does
+    scaler = torch.cuda.amp.GradScaler(
+        enabled=device.type == 'cuda' and _autocast_dtype() == torch.float16
+    )
+
     # Training loop
     print(f"\nStarting training for {config['epochs']} epochs...")
     best_val_acc = 0.0
     history = {'train_loss': [], 'train_acc': [], 'val_loss': [], 'val_acc': []}
 
+    # Checkpoints are written on a background thread so training never waits on disk
+    model_path = os.path.join(model_dir, 'bert_malware_detector.pth')
+    config_path = os.path.join(model_dir, 'model_config.json')
+    save_executor = ThreadPoolExecutor(max_workers=1)
+    pending_save = None
+
     for epoch in range(1, config['epochs'] + 1):
         print(f"\nEpoch {epoch}/{config['epochs']}")
 
-        train_loss, train_acc = train_epoch(model, train_loader, optimizer, scheduler, device, criterion)
-        val_loss, val_acc = evaluate(model, val_loader, device, criterion)
+        train_loss, train_acc = train_epoch(
+            train_forward, train_loader, optimizer, scheduler, device, criterion, scaler, grad_accum_steps
+        )
+        val_loss, val_acc = evaluate(train_forward, val_loader, device, criterion)
 
         history['train_loss'].append(train_loss)
         history['train_acc'].append(train_acc)
@@ -293,12 +584,9 @@ def train_model(config=None):
             best_val_acc = val_acc
             print(f"  [BEST] Saving model with val_acc: {val_acc:.4f}")
 
-            # Save model
-            model_path = os.path.join(model_dir, 'bert_malware_detector.pth')
-            torch.save(model.state_dict(), model_path)
+            # Snapshot the weights now; training keeps updating the live tensors
+            state_dict = {k: v.detach().to('cpu', copy=True) for k, v in model.state_dict().items()}
 
-            # Save config
-            config_path = os.path.join(model_dir, 'model_config.json')
             model_config = {
                 'model_architecture': {
                     'architecture': 'MalwareBERT',
@@ -316,10 +604,17 @@ def train_model(config=None):
                 }
             }
 
-            with open(config_path, 'w') as f:
-                json.dump(model_config, f, indent=2)
-
-            print(f"  Model saved to: {model_path}")
+            # A newer best supersedes a save that hasn't started yet
+            if pending_save is not None:
+                pending_save.cancel()
+            pending_save = save_executor.submit(
+                save_checkpoint, state_dict, model_config, model_path, config_path
+            )
+
+    # Wait for the last checkpoint to hit the disk
+    save_executor.shutdown(wait=True)
+    if pending_save is not None:
+        pending_save.result()
 
     print("\nTraining completed!")
     print(f"Best validation accuracy: {best_val_acc:.4f}")
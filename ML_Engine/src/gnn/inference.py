@@ -4,24 +4,46 @@ Load trained model and make predictions on new shell scripts
 """
 
 import torch
+import torch.nn as nn
+import numpy as np
+from torch_geometric.data import Batch, Data
+import copy
+import functools
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from gnn.model import MalwareGNN
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
 from gnn.graph_builder import ScriptGraphBuilder
 
 
 class GNNPredictor:
     """Inference wrapper for trained GNN model"""
 
-    def __init__(self, model_path=None, config_path=None):
+    def __init__(self, model_path=None, config_path=None, compile_model=None, precision=None, cuda_graph=False):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.builder = ScriptGraphBuilder()
 
+        # Set by _compile_model
+        self.compiled = False
+        self._compile_requested = (
+            compile_model if compile_model is not None else os.environ.get('ML_API_COMPILE', '1') != '0'
+        )
+
+        # Replays a captured CUDA graph for single-script requests (see CUDAGraphGNN)
+        self._cuda_graph_requested = cuda_graph
+        self._graph_runner = None
+
         # Default paths
         if model_path is None:
             model_path = os.path.join(os.path.dirname(__file__), '../../models/gnn/gnn_malware_detector.pth')
@@ -31,6 +53,11 @@ class GNNPredictor:
         # Load config
         self.config = self._load_config(config_path)
 
+        # Inference precision: fp16/bf16 (CUDA only) or fp32. Defaults to fp16 on CUDA,
+        # which halves memory traffic for the small GCN with no measurable accuracy loss
+        default_precision = 'fp16' if self.device.type == 'cuda' else 'fp32'
+        self.precision = (precision or self.config.get('inference_dtype', default_precision)).lower()
+
         # Initialize and load model
         self.model = self._load_model(model_path)
 
@@ -69,6 +96,86 @@ class GNNPredictor:
             print(f"[GNN] WARNING: Model file not found at {model_path}")
             print(f"[GNN] Using untrained model. Train first using: python src/gnn/train.py")
 
+        model = self._apply_precision(model)
+        self._graph_runner = self._capture_cuda_graph(model)
+        return self._compile_model(model)
+
+    def _capture_cuda_graph(self, model):
+        """CUDAGraphGNN for the loaded model, or None when disabled, off CUDA or capture fails"""
+        if not self._cuda_graph_requested or self.device.type != 'cuda':
+            return None
+
+        try:
+            runner = CUDAGraphGNN(model, self.device, self.dtype)
+        except Exception as e:
+            print(f"[GNN] WARNING: CUDA graph capture failed ({e}), using regular launches")
+            return None
+
+        print(f"[GNN] CUDA graph captured for graphs up to {runner.max_nodes} nodes / {runner.max_edges} edges")
+        return runner
+
+    def _predict_one(self, data):
+        """Raw model prediction for one graph on the device, replaying the CUDA graph when it fits"""
+        result = self._graph_runner.predict(data) if self._graph_runner is not None else None
+        return result if result is not None else self.model.predict(data)
+
+    def _apply_precision(self, model):
+        """Convert loaded model to the requested inference precision (sets self.dtype for inputs)"""
+        dtypes = {'fp32': torch.float32, 'fp16': torch.float16, 'bf16': torch.bfloat16}
+
+        if self.precision not in dtypes:
+            print(f"[GNN] WARNING: Unknown precision '{self.precision}', using fp32")
+            self.precision = 'fp32'
+        elif self.precision != 'fp32' and self.device.type != 'cuda':
+            print(f"[GNN] WARNING: {self.precision} requires CUDA, falling back to fp32")
+            self.precision = 'fp32'
+        elif self.precision == 'bf16' and not torch.cuda.is_bf16_supported():
+            print("[GNN] WARNING: bf16 is not supported on this GPU, using fp16")
+            self.precision = 'fp16'
+
+        self.dtype = dtypes[self.precision]
+        if self.dtype != torch.float32:
+            model = model.to(self.dtype)
+            print(f"[GNN] Using {self.precision.upper()} weights")
+
+        return model
+
+    def _to_device(self, data):
+        """Move a PyG Data/Batch to the model's device, with node features in its dtype"""
+        data = data.to(self.device, non_blocking=True)
+        data.x = data.x.to(self.dtype)
+        return data
+
+    def _compile_model(self, model):
+        """
+        Compile the forward pass: torch.compile on CUDA, TorchScript elsewhere
+
+        Graphs differ in node/edge count on every call, so torch.compile treats
+        shapes as dynamic instead of specialising (and recompiling) per graph
+        size. Pass compile_model=False or set ML_API_COMPILE=0 to skip
+        compilation.
+        """
+        if not self._compile_requested:
+            return model
+
+        if self.device.type == 'cuda' and hasattr(torch, 'compile'):
+            # Instance attribute, so predict/predict_batch pick it up and state_dict keys are unchanged
+            model.forward = torch.compile(model.forward, dynamic=True)
+            self.compiled = True
+            print("[GNN] Forward pass compiled with torch.compile")
+            return model
+
+        try:
+            scripted = torch.jit.optimize_for_inference(torch.jit.script(_TensorGNN(model).eval()))
+            scripted_forward = lambda data: scripted(data.x, data.edge_index, _batch_vector(data))
+            _check_scripted_forward(model, scripted_forward)
+        except Exception as e:
+            print(f"[GNN] WARNING: TorchScript compilation failed ({e}), using eager mode")
+            return model
+
+        model.forward = scripted_forward
+        self.compiled = True
+        print("[GNN] Forward pass compiled with TorchScript")
         return model
 
     def predict(self, script_content: str) -> Dict[str, Any]:
@@ -86,36 +193,99 @@ class GNNPredictor:
             G, metadata = self.builder.build_graph(script_content)
 
             # Convert to PyG format
-            pyg_data = self.builder.graph_to_pyg_data(G)
-            pyg_data = pyg_data.to(self.device)
+            pyg_data = self._to_device(self.builder.graph_to_pyg_data(G))
 
             # Make prediction
-            result = self.model.predict(pyg_data)
+            result = self._predict_one(pyg_data)
 
-            # Convert numpy arrays to lists for JSON serialization
-            if 'embedding' in result:
-                result['embedding'] = result['embedding'].tolist()
+            return self._finalize_result(result, metadata)
 
-            # Add graph metadata
-            result['graph_metadata'] = metadata
+        except Exception as e:
+            return self._error_result(e)
 
-            # Determine attack pattern based on graph features
-            result['attack_pattern'] = self._identify_attack_pattern(metadata)
+    def predict_batch(self, scripts: List[str], batch_size: int = 64) -> List[Dict[str, Any]]:
+        """
+        Predict a list of scripts, collating their graphs into PyG batches
 
-            # Risk score (0-100)
-            result['risk_score'] = float(result['prob_malicious'] * 100)
+        Args:
+            scripts: Shell scripts as strings
+            batch_size: Maximum number of graphs per forward pass
 
-            return result
+        Returns:
+            List of prediction dictionaries, in the same order as scripts
+        """
+        results = [None] * len(scripts)
+        self._predict_graphs(map(self._build, scripts), results, batch_size)
+        return results
 
+    def _build(self, script_content: str):
+        """(pyg_data, metadata, None) for a script, or (None, None, error) if its graph can't be built"""
+        try:
+            G, metadata = self.builder.build_graph(script_content)
+            return self.builder.graph_to_pyg_data(G), metadata, None
         except Exception as e:
-            return {
-                'error': str(e),
-                'predicted_class': -1,
-                'is_malicious': False,
-                'confidence': 0.0,
-                'risk_score': 0.0,
-                'attack_pattern': 'unknown'
-            }
+            return None, None, e
+
+    def _predict_graphs(self, graphs, results: list, batch_size: int):
+        """
+        Run built graphs through the model in PyG batches
+
+        Args:
+            graphs: (pyg_data, metadata, error) per entry of results, in order
+            results: Result list to fill in
+            batch_size: Maximum number of graphs per forward pass
+        """
+        # A script whose graph failed to build only fails its own result
+        built = []
+        for idx, (data, metadata, error) in enumerate(graphs):
+            if error is not None:
+                results[idx] = self._error_result(error)
+            else:
+                built.append((idx, data, metadata))
+
+        for start in range(0, len(built), batch_size):
+            chunk = built[start:start + batch_size]
+            try:
+                if len(chunk) == 1 and self._graph_runner is not None:
+                    # Single-script server requests: replay the captured graph
+                    predictions = [self._predict_one(self._to_device(chunk[0][1]))]
+                else:
+                    batch = self._to_device(Batch.from_data_list([data for _, data, _ in chunk]))
+                    predictions = self.model.predict_batch(batch)
+                for (idx, _, metadata), result in zip(chunk, predictions):
+                    results[idx] = self._finalize_result(result, metadata)
+            except Exception as e:
+                for idx, _, _ in chunk:
+                    results[idx] = self._error_result(e)
+
+    def _finalize_result(self, result: Dict, metadata: Dict) -> Dict[str, Any]:
+        """
+        Attach graph metadata, attack pattern and risk score to a raw model prediction
+
+        The embedding stays a NumPy array; serialize results with
+        utils.serialization.NumpyEncoder.
+        """
+        # Add graph metadata
+        result['graph_metadata'] = metadata
+
+        # Determine attack pattern based on graph features
+        result['attack_pattern'] = self._identify_attack_pattern(metadata)
+
+        # Risk score (0-100)
+        result['risk_score'] = float(result['prob_malicious'] * 100)
+
+        return result
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Prediction dictionary returned when a script cannot be analyzed"""
+        return {
+            'error': str(error),
+            'predicted_class': -1,
+            'is_malicious': False,
+            'confidence': 0.0,
+            'risk_score': 0.0,
+            'attack_pattern': 'unknown'
+        }
 
     def _identify_attack_pattern(self, metadata: Dict) -> str:
         """
@@ -133,58 +303,394 @@ class GNNPredictor:
         num_loops = metadata.get('num_loops', 0)
         avg_risk = metadata.get('avg_risk', 0)
 
-        # Pattern detection
-        if has_network and has_execution and has_file_ops:
-            return "download-execute-cleanup"
-        elif has_network and has_execution:
-            return "download-and-execute"
-        elif has_execution and avg_risk > 0.6:
-            return "malicious-execution"
-        elif has_network and num_loops > 0:
-            return "network-scanning"
-        elif has_file_ops and avg_risk > 0.5:
-            return "file-manipulation"
-        elif num_loops > 2:
-            return "potential-cryptominer"
-        else:
-            return "unknown-pattern"
+        # Only which side of each threshold a value falls on matters, so the
+        # cascade is memoized on a small exact fingerprint
+        loops_bin = 2 if num_loops > 2 else (1 if num_loops > 0 else 0)
+        risk_bin = 2 if avg_risk > 0.6 else (1 if avg_risk > 0.5 else 0)
+        return _classify_attack_pattern(has_network, has_execution, has_file_ops, loops_bin, risk_bin)
 
-    def analyze_batch(self, script_paths: list) -> list:
+    def analyze_batch(self, script_paths: list, batch_size: int = 64, num_workers: int = None) -> list:
         """
         Analyze multiple scripts
 
+        All files are read first. Graph building is pure-Python CPU work, so
+        graphs are built in a process pool (one builder per worker), then
+        collated so each forward pass covers up to batch_size scripts.
+
         Args:
             script_paths: List of file paths
+            batch_size: Maximum number of graphs per forward pass
+            num_workers: Graph-building processes (defaults to CPU count, 1 builds in-process)
 
         Returns:
             List of prediction dictionaries
         """
-        results = []
-        for path in script_paths:
+        results = [None] * len(script_paths)
+        loaded = []
+
+        for idx, path in enumerate(script_paths):
             try:
                 with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                    script = f.read()
-                result = self.predict(script)
-                result['filepath'] = path
-                results.append(result)
+                    loaded.append((idx, f.read()))
             except Exception as e:
-                results.append({
+                results[idx] = {
                     'filepath': path,
                     'error': str(e),
                     'is_malicious': False
-                })
+                }
+
+        scripts = [script for _, script in loaded]
+        num_workers = num_workers or os.cpu_count() or 1
+        if num_workers == 1 or len(scripts) < 2:
+            graphs = list(map(self._build, scripts))
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_graph_worker) as pool:
+                graphs = list(pool.map(_build_in_worker, scripts, chunksize=8))
+
+        predictions = [None] * len(scripts)
+        self._predict_graphs(graphs, predictions, batch_size)
+        for (idx, _), result in zip(loaded, predictions):
+            result['filepath'] = script_paths[idx]
+            results[idx] = result
+
         return results
 
 
+class CUDAGraphGNN:
+    """
+    Single-graph MalwareGNN inference through a captured CUDA graph
+
+    The 3-layer GCN launches many tiny kernels; replaying one captured graph
+    removes the per-launch CPU overhead that dominates short scripts. Inputs
+    are copied into static buffers sized for max_nodes/max_edges:
+
+    - GCN normalization (self loops + degree scaling) changes the edge count,
+      so it runs eagerly per request and the captured layers consume the
+      normalized edge weights (normalize=False on a private model copy).
+    - Unused edge slots get weight 0, unused node slots join a second,
+      ignored graph (num_graphs=2), so padding never reaches graph 0.
+
+    predict() returns None for graphs that don't fit; callers fall back to
+    regular execution.
+    """
+
+    def __init__(self, model: MalwareGNN, device, dtype, max_nodes: int = 1024, max_edges: int = 8192):
+        self.model = copy.deepcopy(model).eval()
+        for name in ('conv1', 'conv2', 'conv3'):
+            getattr(self.model, name).normalize = False
+
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+
+        # Static input buffers; replays always read from these addresses
+        self.x = torch.zeros((max_nodes, model.input_dim), dtype=dtype, device=device)
+        self.edge_index = torch.zeros((2, max_edges), dtype=torch.long, device=device)
+        self.edge_weight = torch.zeros(max_edges, dtype=dtype, device=device)
+        self.batch = torch.ones(max_nodes, dtype=torch.long, device=device)
+
+        # Warm up on a side stream (lazy init, cuBLAS handles) before capturing
+        stream = torch.cuda.Stream(device)
+        stream.wait_stream(torch.cuda.current_stream(device))
+        with torch.cuda.stream(stream), torch.no_grad():
+            for _ in range(3):
+                self._forward()
+        torch.cuda.current_stream(device).wait_stream(stream)
+
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.no_grad(), torch.cuda.graph(self.graph):
+            self.logits, self.embedding = self._forward()
+
+    def _forward(self):
+        return self.model.forward_tensors(
+            self.x, self.edge_index, self.batch, edge_weight=self.edge_weight, num_graphs=2
+        )
+
+    def predict(self, data):
+        """
+        Prediction dict for one graph already on the device (same keys as
+        MalwareGNN.predict), or None if it exceeds the captured sizes
+        """
+        num_nodes = data.num_nodes
+        if num_nodes > self.max_nodes:
+            return None
+
+        edge_index, edge_weight = gcn_norm(
+            data.edge_index, None, num_nodes, add_self_loops=True, dtype=self.x.dtype
+        )
+        num_edges = edge_index.size(1)
+        if num_edges > self.max_edges:
+            return None
+
+        self.x[:num_nodes].copy_(data.x)
+        self.x[num_nodes:].zero_()
+        self.edge_index[:, :num_edges].copy_(edge_index)
+        self.edge_index[:, num_edges:].zero_()
+        self.edge_weight[:num_edges].copy_(edge_weight)
+        self.edge_weight[num_edges:].zero_()
+        self.batch[:num_nodes].zero_()
+        self.batch[num_nodes:].fill_(1)
+
+        self.graph.replay()
+
+        # Graph 0 is the script; graph 1 holds the padding
+        probs = torch.softmax(self.logits[:1].float(), dim=1)[0].cpu().numpy()
+        predicted_class = int(probs.argmax())
+        return {
+            'predicted_class': predicted_class,
+            'is_malicious': bool(predicted_class == 1),
+            'confidence': float(probs[predicted_class]),
+            'prob_benign': float(probs[0]),
+            'prob_malicious': float(probs[1]),
+            'embedding': self.embedding[:1].float().cpu().numpy()
+        }
+
+
+@functools.lru_cache(maxsize=256)
+def _classify_attack_pattern(has_network: bool, has_execution: bool, has_file_ops: bool,
+                             loops_bin: int, risk_bin: int) -> str:
+    """
+    Attack pattern for a graph fingerprint
+
+    Args:
+        loops_bin: 0 = no loops, 1 = one or two, 2 = more than two
+        risk_bin: 0 = avg_risk <= 0.5, 1 = <= 0.6, 2 = above 0.6
+    """
+    if has_network and has_execution and has_file_ops:
+        return "download-execute-cleanup"
+    elif has_network and has_execution:
+        return "download-and-execute"
+    elif has_execution and risk_bin == 2:
+        return "malicious-execution"
+    elif has_network and loops_bin > 0:
+        return "network-scanning"
+    elif has_file_ops and risk_bin > 0:
+        return "file-manipulation"
+    elif loops_bin == 2:
+        return "potential-cryptominer"
+    else:
+        return "unknown-pattern"
+
+
+# Per-process graph builder for analyze_batch workers
+_worker_builder = None
+
+
+def _init_graph_worker():
+    """ProcessPoolExecutor initializer: one ScriptGraphBuilder per worker process"""
+    global _worker_builder
+    _worker_builder = ScriptGraphBuilder()
+
+
+def _build_in_worker(script_content: str):
+    """Build one script's graph in a worker process (same result shape as GNNPredictor._build)"""
+    try:
+        G, metadata = _worker_builder.build_graph(script_content)
+        return _worker_builder.graph_to_pyg_data(G), metadata, None
+    except Exception as e:
+        # The message survives pickling even if the exception type doesn't
+        return None, None, RuntimeError(str(e))
+
+
+def _batch_vector(data):
+    """Batch assignment of a Data/Batch; a single graph from graph_to_pyg_data has none"""
+    if data.batch is not None:
+        return data.batch
+    return torch.zeros(data.num_nodes, dtype=torch.long, device=data.x.device)
+
+
+def _check_scripted_forward(model: MalwareGNN, scripted_forward):
+    """
+    Raise unless the scripted forward matches eager mode on a single graph
+
+    The probe is a plain Data without a batch vector, which is what predict()
+    passes, so a scripted forward that only handles Batch inputs is rejected.
+    """
+    model.eval()
+    param = next(model.parameters())
+    probe = Data(x=torch.ones(2, model.conv1.in_channels, dtype=param.dtype, device=param.device),
+                 edge_index=torch.tensor([[0, 1], [1, 0]], device=param.device))
+    with torch.no_grad():
+        expected, _ = model(probe)
+        actual, _ = scripted_forward(probe)
+    if not torch.allclose(actual.float(), expected.float(), atol=1e-4):
+        raise RuntimeError("scripted output differs from eager mode on a single graph")
+
+
+class _TensorGNN(nn.Module):
+    """MalwareGNN with a tensor-only forward, for TorchScript"""
+
+    def __init__(self, model: MalwareGNN):
+        super().__init__()
+        model = copy.deepcopy(model)
+
+        # PyG < 2.5 message-passing layers need jittable() copies to be scripted
+        for name in ('conv1', 'conv2', 'conv3'):
+            conv = getattr(model, name)
+            if hasattr(conv, 'jittable'):
+                setattr(model, name, conv.jittable())
+
+        self.model = model
+
+    def forward(self, x, edge_index, batch):
+        return self.model.forward_tensors(x, edge_index, batch)
+
+
+DEFAULT_ONNX_PATH = os.path.join(os.path.dirname(__file__), '../../models/gnn/gnn_malware_detector.onnx')
+
+
+class _SingleGraphGNN(nn.Module):
+    """MalwareGNN over one graph's (x, edge_index) tensors, for ONNX export"""
+
+    def __init__(self, model: MalwareGNN):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, edge_index):
+        batch = torch.zeros_like(x[:, 0], dtype=torch.long)
+        return self.model.forward_tensors(x, edge_index, batch)
+
+
+def export_onnx(predictor: GNNPredictor, output_path: str = DEFAULT_ONNX_PATH, opset_version: int = 18):
+    """
+    Export a predictor's MalwareGNN to ONNX
+
+    The graph maps one script graph's (x, edge_index) -> (logits, embedding)
+    with dynamic node and edge axes. Pooling is traced for a single graph, so
+    batches are run one graph at a time (see ONNXMalwareGNN). Opset 18 is the
+    first with ScatterElements max, which global_max_pool lowers to. The
+    predictor must hold an uncompiled fp32 model.
+    """
+    model = _SingleGraphGNN(predictor.model.to('cpu').eval())
+
+    # Representative input; shapes are dynamic so the script content does not matter
+    G, _ = predictor.builder.build_graph('wget http://example.com/a.sh\nchmod +x a.sh\n./a.sh')
+    data = predictor.builder.graph_to_pyg_data(G)
+    dummy_input = (data.x, data.edge_index)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            dummy_input,
+            output_path,
+            input_names=['x', 'edge_index'],
+            output_names=['logits', 'embedding'],
+            dynamic_axes={
+                'x': {0: 'num_nodes'},
+                'edge_index': {1: 'num_edges'}
+            },
+            opset_version=opset_version,
+            do_constant_folding=True
+        )
+
+
+class ONNXMalwareGNN:
+    """
+    ONNX Runtime stand-in for MalwareGNN at inference time
+
+    Exposes the same predict/predict_batch interface, so GNNPredictor's graph
+    building and post-processing are reused unchanged. Uses TensorRT (fp16,
+    with engines cached next to the .onnx file) when onnxruntime-gpu provides
+    it, then CUDA, then CPU.
+    """
+
+    def __init__(self, onnx_path: str):
+        if ort is None:
+            raise ImportError("onnxruntime is required. Run: pip install onnxruntime")
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        trt_options = {
+            'trt_fp16_enable': True,
+            'trt_engine_cache_enable': True,
+            'trt_engine_cache_path': os.path.dirname(os.path.abspath(onnx_path)),
+        }
+        available = ort.get_available_providers()
+        providers = [
+            ('TensorrtExecutionProvider', trt_options) if p == 'TensorrtExecutionProvider' else p
+            for p in ('TensorrtExecutionProvider', 'CUDAExecutionProvider', 'CPUExecutionProvider')
+            if p in available
+        ]
+
+        self.session = ort.InferenceSession(onnx_path, sess_options, providers=providers)
+
+    def predict(self, data):
+        """Make prediction for a single graph"""
+        logits, embedding = self.session.run(None, {
+            'x': data.x.cpu().numpy(),
+            'edge_index': data.edge_index.cpu().numpy()
+        })
+        probs = logits[0].astype(np.float32)
+
+        # Numerically stable softmax
+        probs = np.exp(probs - probs.max())
+        probs /= probs.sum()
+
+        predicted_class = int(probs.argmax())
+        return {
+            'predicted_class': predicted_class,
+            'is_malicious': bool(predicted_class == 1),
+            'confidence': float(probs[predicted_class]),
+            'prob_benign': float(probs[0]),
+            'prob_malicious': float(probs[1]),
+            'embedding': embedding.astype(np.float32)
+        }
+
+    def predict_batch(self, batch):
+        """Make predictions for a PyG Batch, one graph per session run"""
+        return [self.predict(data) for data in batch.to_data_list()]
+
+
+class ONNXGNNPredictor(GNNPredictor):
+    """
+    GNNPredictor backed by an exported ONNX model (see scripts/export_onnx.py)
+
+    If no export exists yet, one is created from the trained PyTorch weights
+    on first load.
+    """
+
+    def __init__(self, onnx_path=None, config_path=None):
+        self.onnx_path = onnx_path or DEFAULT_ONNX_PATH
+        super().__init__(config_path=config_path, compile_model=False, precision='fp32')
+
+        # ONNX Runtime consumes host fp32 numpy arrays; keep graph tensors on CPU
+        self.device = torch.device('cpu')
+        self.dtype = torch.float32
+
+    def _load_model(self, model_path):
+        """Create the ONNX Runtime session, exporting the .pth weights first if needed"""
+        if not os.path.exists(self.onnx_path):
+            print(f"[GNN] No ONNX model at {self.onnx_path}, exporting from {model_path}")
+            export_onnx(GNNPredictor(model_path, compile_model=False, precision='fp32'), self.onnx_path)
+
+        model = ONNXMalwareGNN(self.onnx_path)
+        print(f"[GNN] ONNX model loaded from: {self.onnx_path} ({model.session.get_providers()[0]})")
+        return model
+
+
 # Singleton instance
 _predictor_instance = None
 
 
 def get_predictor() -> GNNPredictor:
-    """Get or create predictor instance (singleton)"""
+    """
+    Get or create predictor instance (singleton)
+
+    ML_API_BACKEND selects the runtime: 'onnx' (exporting the model on first
+    use if needed), 'torch', or 'auto' (default), which uses ONNX Runtime when
+    it is installed and an exported model exists.
+    """
     global _predictor_instance
     if _predictor_instance is None:
-        _predictor_instance = GNNPredictor()
+        backend = os.environ.get('ML_API_BACKEND', 'auto').lower()
+        use_onnx = backend == 'onnx' or (
+            backend == 'auto' and ort is not None and os.path.exists(DEFAULT_ONNX_PATH)
+        )
+        # Long-lived server instance: worth capturing a CUDA graph (ML_API_CUDA_GRAPH=0 disables)
+        cuda_graph = os.environ.get('ML_API_CUDA_GRAPH', '1') != '0'
+        _predictor_instance = ONNXGNNPredictor() if use_onnx else GNNPredictor(cuda_graph=cuda_graph)
     return _predictor_instance
 
 
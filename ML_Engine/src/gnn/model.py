@@ -6,6 +6,7 @@ GNN Model Architecture for Malware Detection
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from typing import Optional
 from torch_geometric.nn import GCNConv, global_mean_pool, global_max_pool
 
 
@@ -52,6 +53,7 @@ class MalwareGNN(nn.Module):
 
         self.dropout_layer = nn.Dropout(dropout)
 
+    @torch.jit.unused
     def forward(self, data):
         """
         Forward pass
@@ -66,28 +68,44 @@ class MalwareGNN(nn.Module):
             - logits: Class logits [batch_size, num_classes]
             - embeddings: Graph embeddings [batch_size, hidden_dim]
         """
-        x, edge_index, batch = data.x, data.edge_index, data.batch
+        return self.forward_tensors(data.x, data.edge_index, data.batch)
 
+    def forward_tensors(self, x, edge_index, batch,
+                        edge_weight: Optional[torch.Tensor] = None, num_graphs: Optional[int] = None):
+        """
+        Forward pass on plain tensors (TorchScript/ONNX friendly)
+
+        Args:
+            x: Node features [num_nodes, input_dim]
+            edge_index: Edge list [2, num_edges]
+            batch: Batch assignment vector [num_nodes]
+            edge_weight: Optional per-edge weights passed to every GCN layer
+            num_graphs: Number of graphs in the batch; inferred from batch
+                (a device sync) when None
+
+        Returns:
+            Same (logits, embeddings) as forward
+        """
         # GCN Layer 1
-        x = self.conv1(x, edge_index)
+        x = self.conv1(x, edge_index, edge_weight)
         x = self.bn1(x)
         x = F.relu(x)
         x = self.dropout_layer(x)
 
         # GCN Layer 2
-        x = self.conv2(x, edge_index)
+        x = self.conv2(x, edge_index, edge_weight)
         x = self.bn2(x)
         x = F.relu(x)
         x = self.dropout_layer(x)
 
         # GCN Layer 3
-        x = self.conv3(x, edge_index)
+        x = self.conv3(x, edge_index, edge_weight)
         x = self.bn3(x)
         x = F.relu(x)
 
         # Graph-level pooling (combine mean and max)
-        x_mean = global_mean_pool(x, batch)
-        x_max = global_max_pool(x, batch)
+        x_mean = global_mean_pool(x, batch, num_graphs)
+        x_max = global_max_pool(x, batch, num_graphs)
         x = torch.cat([x_mean, x_max], dim=1)
 
         # Save graph embedding for analysis
@@ -116,6 +134,8 @@ class MalwareGNN(nn.Module):
         self.eval()
         with torch.no_grad():
             logits, embedding = self.forward(data)
+            # Upcast so softmax and outputs are fp32 when the model runs in half precision
+            logits, embedding = logits.float(), embedding.float()
             probabilities = F.softmax(logits, dim=1)
 
             predicted_class = torch.argmax(probabilities, dim=1).item()
@@ -130,6 +150,36 @@ class MalwareGNN(nn.Module):
                 'embedding': embedding.cpu().numpy()
             }
 
+    def predict_batch(self, data):
+        """
+        Make predictions for a PyG Batch of graphs in a single forward pass
+
+        Returns:
+            List of prediction dicts (same keys as predict), one per graph
+        """
+        self.eval()
+        with torch.no_grad():
+            logits, embeddings = self.forward(data)
+            logits, embeddings = logits.float(), embeddings.float()
+            probabilities = F.softmax(logits, dim=1)
+
+        probabilities = probabilities.cpu().numpy()
+        embeddings = embeddings.cpu().numpy()
+
+        results = []
+        for probs, embedding in zip(probabilities, embeddings):
+            predicted_class = int(probs.argmax())
+            results.append({
+                'predicted_class': predicted_class,
+                'is_malicious': bool(predicted_class == 1),
+                'confidence': float(probs[predicted_class]),
+                'prob_benign': float(probs[0]),
+                'prob_malicious': float(probs[1]),
+                'embedding': embedding[None, :]
+            })
+
+        return results
+
 
 class EarlyStopping:
     """Early stopping to prevent overfitting"""
@@ -80,7 +80,7 @@ def train_epoch(model, loader, optimizer, device):
 
     for data in loader:
         data = data.to(device)
-        optimizer.zero_grad()
+        optimizer.zero_grad(set_to_none=True)
 
         logits, _ = model(data)
         loss = F.cross_entropy(logits, data.y)
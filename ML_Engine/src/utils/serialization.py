@@ -0,0 +1,21 @@
+"""
+JSON serialization helpers
+"""
+
+import json
+
+
+class NumpyEncoder(json.JSONEncoder):
+    """
+    JSON encoder that converts NumPy arrays and scalars on demand
+
+    Lets prediction results keep arrays (e.g. GNN embeddings) as-is and pay
+    for the element-by-element list conversion only when they are actually
+    serialized. NumPy is not imported; anything with a tolist() method is
+    converted with it.
+    """
+
+    def default(self, obj):
+        if hasattr(obj, 'tolist'):
+            return obj.tolist()
+        return super().default(obj)
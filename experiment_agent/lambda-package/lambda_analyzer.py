@@ -8,10 +8,386 @@ No subprocess dependencies - pure Python implementation
 import os
 import json
 import hashlib
+import io
+import itertools
 import re
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# Enhanced threat patterns with better detection
+THREAT_PATTERNS = {
+    "network_operations": {
+        "patterns": [r'\bcurl\b', r'\bwget\b', r'\bnc\b', r'\bnetcat\b', 
+                   r'\btelnet\b', r'/dev/tcp/', r'/dev/udp/'],
+        "weight": 3,
+        "category": "Network Communication",
+        "count_multiplier": True
+    },
+    "download_execute": {
+        "patterns": [r'(wget|curl).*chmod.*\d{3,4}.*\./', 
+                   r'(wget|curl).*-[Oo].*chmod',
+                   r'chmod\s+777.*\./'],
+        "weight": 5,
+        "category": "Download and Execute Pattern",
+        "count_multiplier": True
+    },
+    "reverse_shells": {
+        "patterns": [r'/bin/bash\s+-i', r'/bin/sh\s+-i', r'bash\s+-c.*sh\s+-i',
+                   r'nc.*-e\s+/bin/(ba)?sh', r'python.*socket.*subprocess'],
+        "weight": 5,
+        "category": "Reverse Shell"
+    },
+    "encoding_obfuscation": {
+        "patterns": [r'\bbase64\b.*-d', r'\bxxd\b', r'openssl\s+enc',
+                   r'echo.*\|.*base64', r'eval\s*\$\('],
+        "weight": 4,
+        "category": "Obfuscation"
+    },
+    "privilege_escalation": {
+        "patterns": [r'\bsudo\b', r'\bsu\s+', r'chmod\s+[+]?[67]77',
+                   r'passwd\b', r'usermod\b', r'adduser\b'],
+        "weight": 4,
+        "category": "Privilege Escalation",
+        "count_multiplier": True
+    },
+    "persistence": {
+        "patterns": [r'crontab', r'systemctl', r'\.bashrc', r'\.profile',
+                   r'\.bash_profile', r'/etc/rc\.local', r'systemd.*enable'],
+        "weight": 4,
+        "category": "Persistence Mechanism"
+    },
+    "file_operations": {
+        "patterns": [r'rm\s+-rf\s+/', r'rm\s+-rf\s+\*', r'rm\s+-rf\s+\.\*',
+                   r'>\s*/dev/sda', r'dd\s+if=.*of=/dev/', r'mkfs\b'],
+        "weight": 5,
+        "category": "Destructive File Operations"
+    },
+    "data_exfiltration": {
+        "patterns": [r'scp\b', r'rsync\b', r'ftp\b', r'nc.*>',
+                   r'curl.*--data', r'wget.*--post'],
+        "weight": 4,
+        "category": "Data Exfiltration"
+    },
+    "reconnaissance": {
+        "patterns": [r'\buname\b', r'\bwhoami\b', r'\bid\b', r'\bhostname\b',
+                   r'ifconfig\b', r'ip\s+addr', r'/etc/passwd', r'/etc/shadow'],
+        "weight": 2,
+        "category": "System Reconnaissance"
+    },
+    "process_hiding": {
+        "patterns": [r'\bnohup\b', r'\bdisown\b', r'&\s*$', r'setsid\b'],
+        "weight": 3,
+        "category": "Process Hiding"
+    },
+    "credential_access": {
+        "patterns": [r'password', r'passwd', r'ssh.*key', r'private.*key',
+                   r'\.aws/credentials', r'API.*KEY', r'token'],
+        "weight": 3,
+        "category": "Credential Access"
+    },
+    "multi_architecture": {
+        "patterns": [r'(x86_64|mips|arm|i486|i686|powerpc|sparc|m68k).*linux',
+                   r'musl|uclibc'],
+        "weight": 4,
+        "category": "Multi-Architecture Targeting (Botnet Indicator)",
+        "count_multiplier": True
+    },
+    "cover_tracks": {
+        "patterns": [r'rm\s+-rf\s+\.\*', r'history\s+-c', r'unset\s+HISTFILE',
+                   r'>\s+~/\.bash_history'],
+        "weight": 5,
+        "category": "Anti-Forensics / Cover Tracks"
+    }
+}
+
+
+# Shell commands tracked by detect_commands, grouped by category
+COMMANDS = {
+    "network": ['curl', 'wget', 'nc', 'netcat', 'telnet', 'ssh', 'scp', 'ftp'],
+    "file_ops": ['rm', 'mv', 'cp', 'chmod', 'chown', 'dd', 'shred'],
+    "system": ['systemctl', 'service', 'crontab', 'kill', 'pkill'],
+    "package": ['apt', 'apt-get', 'yum', 'dnf', 'pip', 'npm'],
+    "process": ['ps', 'top', 'nohup', 'bg', 'fg', 'jobs'],
+    "user": ['useradd', 'usermod', 'passwd', 'su', 'sudo']
+}
+
+# File types by extension (no 'file' command in Lambda)
+FILE_TYPES = {
+    '.sh': 'Bourne-Again shell script',
+    '.bash': 'Bash shell script',
+    '.py': 'Python script',
+    '.js': 'JavaScript source',
+    '.exe': 'PE32 executable',
+    '.elf': 'ELF executable',
+    '.pl': 'Perl script',
+    '.rb': 'Ruby script'
+}
+
+# Keywords flagged by _find_suspicious_keywords (lowercase)
+SUSPICIOUS_KEYWORDS = ['password', 'secret', 'token', 'api_key', 'private_key',
+                       'exploit', 'payload', 'backdoor', 'rootkit', 'malware',
+                       'botnet', 'ddos', 'flood', 'scanner']
+
+# Behavioral indicators: name -> (pattern, flags, matches needed to flag it)
+BEHAVIOR_PATTERNS = {
+    "has_network_activity": (r'curl|wget|nc|telnet', re.I, 1),
+    "modifies_system_files": (r'/etc/|/usr/|/var/', 0, 1),
+    "uses_encoding": (r'base64|xxd|openssl enc', re.I, 1),
+    "creates_persistence": (r'crontab|systemctl|\.bashrc|\.profile', re.I, 1),
+    "escalates_privileges": (r'sudo|su\s|chmod.*777', re.I, 1),
+    "hides_processes": (r'nohup|disown|&\s*$', 0, 1),
+    "downloads_files": (r'curl.*-[Oo]|wget.*-O', re.I, 1),
+    "executes_remote_code": (r'(curl|wget).*\|.*(bash|sh)', re.I, 1),
+    "immediate_execution": (r'chmod.*\d{3}.*\./', 0, 1),
+    "multi_architecture_targeting": (r'(x86_64|mips|arm|i[3-6]86)', re.I, 4),
+    "covers_tracks": (r'rm.*-rf.*\.\*|history.*-c', re.I, 1)
+}
+
+
+# Longest stretch a '.*' in a pattern may cover. Patterns run on untrusted
+# uploads, and unbounded wildcards between tokens backtrack super-linearly on
+# long lines crafted to almost match.
+MAX_WILDCARD_SPAN = 200
+
+
+def _bound_wildcards(pattern):
+    """Rewrite each unescaped '.*' as a bounded single-line gap"""
+    return re.sub(r'(?<!\\)\.\*', lambda _: r'[^\n]{0,%d}' % MAX_WILDCARD_SPAN, pattern)
+
+
+def _compile_content_pattern(pattern, flags=0):
+    """Compile a content pattern, with its wildcards bounded"""
+    return re.compile(_bound_wildcards(pattern), flags)
+
+
+def _ascii_bytes_pattern(pattern):
+    """
+    Bytes form of a compiled text pattern, for scanning ASCII content
+
+    On ASCII input the two agree on \\b, \\d and case-insensitive matching;
+    only \\s differs, as text \\s also matches the \\x1c-\\x1f separators, so it
+    is spelled out. (No pattern uses \\s inside a character class.)
+    """
+    source = re.sub(r'(?<!\\)((?:\\\\)*)\\s', r'\1[\\t-\\r\\x1c-\\x20]', pattern.pattern)
+    return re.compile(source.encode('ascii'), pattern.flags & ~re.UNICODE)
+
+
+def _compile_threat_patterns(threat_patterns):
+    """Compile every threat pattern once (case-insensitive, multiline)"""
+    return {
+        threat_type: dict(config, patterns=[_compile_content_pattern(p, re.IGNORECASE | re.MULTILINE)
+                                            for p in config["patterns"]])
+        for threat_type, config in threat_patterns.items()
+    }
+
+
+def _compile_command_patterns(commands):
+    """
+    One whole-word alternation per command category
+
+    Longer commands are tried first so 'apt-get' is not reported as 'apt'.
+    """
+    return {
+        category: _compile_content_pattern(r'\b(' + '|'.join(sorted(map(re.escape, cmds), key=len, reverse=True)) + r')\b')
+        for category, cmds in commands.items()
+    }
+
+
+def _implied_commands(commands):
+    """
+    Commands that also contain another command as a whole word (e.g. apt-get
+    contains apt), so their matches count towards that command as well
+    """
+    implied = {}
+    for cmds in commands.values():
+        for cmd in cmds:
+            implied[cmd] = [other for other in cmds
+                            if other != cmd and re.search(r'\b' + re.escape(cmd) + r'\b', other)]
+    return implied
+
+
+# hashlib releases the GIL while hashing large buffers, so the digests of a big
+# file run on separate cores. Worker threads are only started on first use.
+HASH_ALGORITHMS = ("md5", "sha256", "sha1")
+_HASH_POOL = ThreadPoolExecutor(max_workers=len(HASH_ALGORITHMS))
+_PARALLEL_HASH_MIN_BYTES = 1 << 20
+
+
+def _hexdigest(algorithm, data):
+    """Hex digest of data with the named hashlib algorithm"""
+    return getattr(hashlib, algorithm)(data).hexdigest()
+
+
+def _printable_strings(content, min_length=4):
+    """
+    Printable ASCII runs of at least min_length bytes (mimics 'strings')
+
+    Uses a vectorized NumPy scan when available, otherwise a bytes regex.
+    Either way each run is decoded with one bytes.decode call rather than
+    being rebuilt character by character.
+
+    Args:
+        content: Raw file bytes
+        min_length: Minimum string length
+
+    Returns:
+        List of extracted strings in file order
+    """
+    if np is not None:
+        arr = np.frombuffer(content, dtype=np.uint8)
+        padded = np.zeros(len(arr) + 2, dtype=np.int8)
+        padded[1:-1] = (arr >= 32) & (arr <= 126)  # Printable ASCII range
+
+        # +1 where a printable run starts, -1 one past where it ends
+        edges = np.diff(padded)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        keep = (ends - starts) >= min_length
+        return [content[start:end].decode('ascii')
+                for start, end in zip(starts[keep].tolist(), ends[keep].tolist())]
+
+    printable_runs = re.compile(rb'[\x20-\x7e]{%d,}' % min_length)  # Printable ASCII range
+    return [run.decode('ascii') for run in printable_runs.findall(content)]
+
+
+def _first_unique(pattern, text, limit):
+    """
+    First distinct matches of a pattern, in order of appearance
+
+    Stops scanning once limit distinct matches are found, instead of
+    collecting every match and deduplicating afterwards.
+    """
+    found = {}
+    for match in pattern.finditer(text):
+        found[match.group(0)] = None
+        if len(found) >= limit:
+            break
+    return list(found)
+
+
+def _line_counts(content):
+    """
+    Total and distinct line counts, as for content.split('\n')
+
+    Lines are streamed and only the hash of each is kept, so peak memory is a
+    set of ints instead of a list of every line plus a set of the distinct ones.
+
+    Args:
+        content: Scan content, ASCII bytes or decoded text
+
+    Returns:
+        (total_lines, unique_lines)
+    """
+    if isinstance(content, bytes):
+        stream, newline = io.BytesIO(content), b'\n'
+    else:
+        stream, newline = io.StringIO(content), '\n'
+    seen = set()
+    for line in stream:
+        seen.add(hash(line[:-1] if line.endswith(newline) else line))
+    if not content or content.endswith(newline):
+        # split() yields a trailing empty line here
+        seen.add(hash(newline[:0]))
+    return content.count(newline) + 1, len(seen)
+
+
+def _sample_text(match):
+    """Text of a findall result (a match, or a tuple of groups), bytes or str"""
+    if isinstance(match, tuple):
+        return str(tuple(_sample_text(group) for group in match))
+    if isinstance(match, bytes):
+        return match.decode('ascii')
+    return match
+
+
+def _build_keyword_automaton(keywords):
+    """Aho-Corasick automaton over the keywords, or None without pyahocorasick"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+_THREAT_PATTERNS = _compile_threat_patterns(THREAT_PATTERNS)
+_CMD_PATTERNS = _compile_command_patterns(COMMANDS)
+_IMPLIED_COMMANDS = _implied_commands(COMMANDS)
+_KEYWORD_AC = _build_keyword_automaton(SUSPICIOUS_KEYWORDS)
+_KEYWORD_RE = re.compile('|'.join(map(re.escape, SUSPICIOUS_KEYWORDS)))
+
+# Indicators extracted from printable strings
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+', re.IGNORECASE)
+_IP_RE = re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
+_DOMAIN_RE = re.compile(r'\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,}\b')
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+
+# Every pattern the analyzer runs over file content, flattened into one scan
+# table. Identical patterns share a slot, so each is scanned once per file and
+# analyze_threats, detect_commands and behavioral_analysis all read the results.
+_SCAN_PATTERNS = []  # compiled pattern per slot
+_SCAN_LIMITS = []    # matches needed per slot (None = all of them)
+_SCAN_SLOTS = {}     # (pattern, flags, limit) -> slot
+
+
+def _scan_slot(pattern, limit=None):
+    """
+    Slot in the scan table for a compiled pattern, adding it if needed
+
+    Args:
+        pattern: Compiled pattern
+        limit: Stop scanning after this many matches (None = find them all)
+    """
+    key = (pattern.pattern, pattern.flags, limit)
+    if key not in _SCAN_SLOTS:
+        _SCAN_SLOTS[key] = len(_SCAN_PATTERNS)
+        _SCAN_PATTERNS.append(pattern)
+        _SCAN_LIMITS.append(limit)
+    return _SCAN_SLOTS[key]
+
+
+_THREAT_SLOTS = {
+    threat_type: [_scan_slot(pattern) for pattern in config["patterns"]]
+    for threat_type, config in _THREAT_PATTERNS.items()
+}
+_CMD_SLOTS = {category: _scan_slot(pattern) for category, pattern in _CMD_PATTERNS.items()}
+_BEHAVIOR_SLOTS = {
+    name: _scan_slot(_compile_content_pattern(pattern, flags), limit=needed)
+    for name, (pattern, flags, needed) in BEHAVIOR_PATTERNS.items()
+}
+
+# The same table as bytes patterns. ASCII content (nearly every script) is
+# scanned with these directly, skipping the decode; other content is decoded
+# and scanned with the text patterns, keeping their Unicode semantics.
+_ASCII_SCAN_PATTERNS = [_ascii_bytes_pattern(pattern) for pattern in _SCAN_PATTERNS]
+
+
+# Identifies the analysis logic (patterns, weights, scoring). Derived from this
+# module's source, so results stored by content hash are never reused across
+# a change to any of it.
+ANALYZER_VERSION = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:12]
+
+
+# Threat score at which calculate_risk_score's threat term alone reaches the
+# Malicious cutoff (min(score, 100) * 0.6 >= 60), whatever the behaviors
+CONCLUSIVE_THREAT_SCORE = 100
+
 
 class ShellScriptAnalyzer:
     def __init__(self, filepath):
@@ -25,121 +401,92 @@ class ShellScriptAnalyzer:
             "threat_indicators": [],
             "behavioral_analysis": {},
             "risk_assessment": {},
-            "timestamp": datetime.now(timezone.utc).isoformat()
+            "timestamp": None  # Set when analyze() runs
         }
         
-        # Enhanced threat patterns with better detection
-        self.threat_patterns = {
-            "network_operations": {
-                "patterns": [r'\bcurl\b', r'\bwget\b', r'\bnc\b', r'\bnetcat\b', 
-                           r'\btelnet\b', r'/dev/tcp/', r'/dev/udp/'],
-                "weight": 3,
-                "category": "Network Communication",
-                "count_multiplier": True
-            },
-            "download_execute": {
-                "patterns": [r'(wget|curl).*chmod.*\d{3,4}.*\./', 
-                           r'(wget|curl).*-[Oo].*chmod',
-                           r'chmod\s+777.*\./'],
-                "weight": 5,
-                "category": "Download and Execute Pattern",
-                "count_multiplier": True
-            },
-            "reverse_shells": {
-                "patterns": [r'/bin/bash\s+-i', r'/bin/sh\s+-i', r'bash\s+-c.*sh\s+-i',
-                           r'nc.*-e\s+/bin/(ba)?sh', r'python.*socket.*subprocess'],
-                "weight": 5,
-                "category": "Reverse Shell"
-            },
-            "encoding_obfuscation": {
-                "patterns": [r'\bbase64\b.*-d', r'\bxxd\b', r'openssl\s+enc',
-                           r'echo.*\|.*base64', r'eval\s*\$\('],
-                "weight": 4,
-                "category": "Obfuscation"
-            },
-            "privilege_escalation": {
-                "patterns": [r'\bsudo\b', r'\bsu\s+', r'chmod\s+[+]?[67]77',
-                           r'passwd\b', r'usermod\b', r'adduser\b'],
-                "weight": 4,
-                "category": "Privilege Escalation",
-                "count_multiplier": True
-            },
-            "persistence": {
-                "patterns": [r'crontab', r'systemctl', r'\.bashrc', r'\.profile',
-                           r'\.bash_profile', r'/etc/rc\.local', r'systemd.*enable'],
-                "weight": 4,
-                "category": "Persistence Mechanism"
-            },
-            "file_operations": {
-                "patterns": [r'rm\s+-rf\s+/', r'rm\s+-rf\s+\*', r'rm\s+-rf\s+\.\*',
-                           r'>\s*/dev/sda', r'dd\s+if=.*of=/dev/', r'mkfs\b'],
-                "weight": 5,
-                "category": "Destructive File Operations"
-            },
-            "data_exfiltration": {
-                "patterns": [r'scp\b', r'rsync\b', r'ftp\b', r'nc.*>',
-                           r'curl.*--data', r'wget.*--post'],
-                "weight": 4,
-                "category": "Data Exfiltration"
-            },
-            "reconnaissance": {
-                "patterns": [r'\buname\b', r'\bwhoami\b', r'\bid\b', r'\bhostname\b',
-                           r'ifconfig\b', r'ip\s+addr', r'/etc/passwd', r'/etc/shadow'],
-                "weight": 2,
-                "category": "System Reconnaissance"
-            },
-            "process_hiding": {
-                "patterns": [r'\bnohup\b', r'\bdisown\b', r'&\s*$', r'setsid\b'],
-                "weight": 3,
-                "category": "Process Hiding"
-            },
-            "credential_access": {
-                "patterns": [r'password', r'passwd', r'ssh.*key', r'private.*key',
-                           r'\.aws/credentials', r'API.*KEY', r'token'],
-                "weight": 3,
-                "category": "Credential Access"
-            },
-            "multi_architecture": {
-                "patterns": [r'(x86_64|mips|arm|i486|i686|powerpc|sparc|m68k).*linux',
-                           r'musl|uclibc'],
-                "weight": 4,
-                "category": "Multi-Architecture Targeting (Botnet Indicator)",
-                "count_multiplier": True
-            },
-            "cover_tracks": {
-                "patterns": [r'rm\s+-rf\s+\.\*', r'history\s+-c', r'unset\s+HISTFILE',
-                           r'>\s+~/\.bash_history'],
-                "weight": 5,
-                "category": "Anti-Forensics / Cover Tracks"
-            }
-        }
+        # Compiled once at import time and shared by every instance
+        self.threat_patterns = _THREAT_PATTERNS
+        self._scan_results = None
+
+        # File content, read once and shared by every analysis step: the raw
+        # bytes, and the newline-normalized content for pattern scans (the
+        # bytes themselves when ASCII, otherwise the decoded text)
+        self._bytes = None
+        self._content = None
+
+        # Set by from_bytes when the content never touches the filesystem
+        self._in_memory = False
+        self._modified = None
+
+    @classmethod
+    def from_bytes(cls, filename, data, source=None, modified=None):
+        """
+        Analyzer for in-memory content, such as an S3 object body
+
+        Args:
+            filename: Original file name (reported, and used for the file type)
+            data: Raw file bytes
+            source: Where the content came from, reported as the file path
+            modified: Last-modified datetime of the source, if known
+
+        Returns:
+            ShellScriptAnalyzer that never reads from disk
+        """
+        analyzer = cls(source or filename)
+        analyzer.filename = filename
+        analyzer._bytes = data
+        analyzer._in_memory = True
+        analyzer._modified = modified
+        return analyzer
+
+    def _load_content(self):
+        """Read the file once; later calls reuse the raw and scan content"""
+        if self._content is None:
+            if self._bytes is None:
+                with open(self.filepath, 'rb') as f:
+                    self._bytes = f.read()
+            content = self._bytes
+            if not content.isascii():
+                content = content.decode('utf-8', 'ignore')
+            if '\r' in content if isinstance(content, str) else b'\r' in content:
+                # Same universal-newline handling as reading in text mode
+                if isinstance(content, str):
+                    content = content.replace('\r\n', '\n').replace('\r', '\n')
+                else:
+                    content = content.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            self._content = content
 
     def extract_metadata(self):
         """Extract basic file metadata - Lambda compatible"""
         try:
-            stat_info = os.stat(self.filepath)
-            
             # Detect file type from extension (no 'file' command in Lambda)
-            file_extension = os.path.splitext(self.filepath)[1].lower()
-            file_type_map = {
-                '.sh': 'Bourne-Again shell script',
-                '.bash': 'Bash shell script',
-                '.py': 'Python script',
-                '.js': 'JavaScript source',
-                '.exe': 'PE32 executable',
-                '.elf': 'ELF executable',
-                '.pl': 'Perl script', 
-                '.rb': 'Ruby script'
-            }
+            file_extension = os.path.splitext(self.filename)[1].lower()
             
+            if self._in_memory:
+                # No file on disk: size from the content, times from the source.
+                # Object stores keep no creation time or mode, so created
+                # mirrors the last-modified time (or the read time if unknown).
+                modified = (self._modified or datetime.now(timezone.utc)).isoformat()
+                self.results["metadata"] = {
+                    "filename": self.filename,
+                    "filepath": self.filepath,
+                    "size_bytes": len(self._bytes),
+                    "permissions": "n/a",
+                    "created": modified,
+                    "modified": modified,
+                    "file_type": FILE_TYPES.get(file_extension, f"Unknown{file_extension}")
+                }
+                return
+
+            stat_info = os.stat(self.filepath)
             self.results["metadata"] = {
                 "filename": self.filename,
                 "filepath": self.filepath,
                 "size_bytes": stat_info.st_size,
-                "permissions": oct(stat_info.st_mode)[-3:],
+                "permissions": f"{stat_info.st_mode & 0o777:03o}",
                 "created": datetime.fromtimestamp(stat_info.st_ctime).isoformat(),
                 "modified": datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
-                "file_type": file_type_map.get(file_extension, f"Unknown{file_extension}")
+                "file_type": FILE_TYPES.get(file_extension, f"Unknown{file_extension}")
             }
             
         except Exception as e:
@@ -148,61 +495,35 @@ class ShellScriptAnalyzer:
     def generate_hashes(self):
         """Generate file hashes for fingerprinting"""
         try:
-            with open(self.filepath, 'rb') as f:
-                content = f.read()
-                self.results["hashes"] = {
-                    "md5": hashlib.md5(content).hexdigest(),
-                    "sha256": hashlib.sha256(content).hexdigest(),
-                    "sha1": hashlib.sha1(content).hexdigest()
-                }
+            self._load_content()
+            content = self._bytes
+            if len(content) >= _PARALLEL_HASH_MIN_BYTES:
+                digests = _HASH_POOL.map(_hexdigest, HASH_ALGORITHMS, [content] * len(HASH_ALGORITHMS))
+            else:
+                # Thread hand-off costs more than it saves on small scripts
+                digests = [_hexdigest(algorithm, content) for algorithm in HASH_ALGORITHMS]
+            self.results["hashes"] = dict(zip(HASH_ALGORITHMS, digests))
         except Exception as e:
             self.results["hashes"]["error"] = str(e)
 
     def analyze_strings(self):
-        """Extract and analyze strings from file - Pure Python implementation"""
+        """Extract and analyze strings from file"""
         try:
-            # Pure Python string extraction (mimics 'strings' command)
-            with open(self.filepath, 'rb') as f:
-                content = f.read()
-            
-            all_strings = []
-            current_string = []
+            # String extraction (mimics 'strings' command)
+            self._load_content()
+            all_strings = _printable_strings(self._bytes)
             
-            for byte in content:
-                if 32 <= byte <= 126:  # Printable ASCII range
-                    current_string.append(chr(byte))
-                else:
-                    if len(current_string) >= 4:  # Minimum string length
-                        all_strings.append(''.join(current_string))
-                    current_string = []
-            
-            # Don't forget the last string
-            if len(current_string) >= 4:
-                all_strings.append(''.join(current_string))
-            
-            # Pattern matching
-            urls = []
-            ips = []
-            domains = []
-            emails = []
-            
-            url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-            ip_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
-            domain_pattern = r'\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,}\b'
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-            
-            for string in all_strings:
-                urls.extend(re.findall(url_pattern, string, re.IGNORECASE))
-                ips.extend(re.findall(ip_pattern, string))
-                domains.extend(re.findall(domain_pattern, string.lower()))
-                emails.extend(re.findall(email_pattern, string))
+            # Pattern matching: one scan per pattern over all strings. None of
+            # the patterns can match across a newline, so joining the strings
+            # with one gives the same matches as scanning them separately.
+            corpus = '\n'.join(all_strings)
             
             self.results["strings_analysis"] = {
                 "total_strings": len(all_strings),
-                "urls_found": list(set(urls))[:20],
-                "ip_addresses": list(set(ips))[:20],
-                "domains": list(set(domains))[:20],
-                "emails": list(set(emails))[:10],
+                "urls_found": _first_unique(_URL_RE, corpus, 20),
+                "ip_addresses": _first_unique(_IP_RE, corpus, 20),
+                "domains": _first_unique(_DOMAIN_RE, corpus.lower(), 20),
+                "emails": _first_unique(_EMAIL_RE, corpus, 10),
                 "suspicious_keywords": self._find_suspicious_keywords(all_strings)
             }
             
@@ -210,45 +531,91 @@ class ShellScriptAnalyzer:
             self.results["strings_analysis"]["error"] = str(e)
 
     def _find_suspicious_keywords(self, strings):
-        """Find suspicious keywords in strings"""
-        keywords = ['password', 'secret', 'token', 'api_key', 'private_key', 
-                   'exploit', 'payload', 'backdoor', 'rootkit', 'malware',
-                   'botnet', 'ddos', 'flood', 'scanner']
-        found = []
-        
+        """
+        Find suspicious keywords in strings
+
+        All strings are lowercased and joined once, then swept in a single
+        pass (Aho-Corasick when available, otherwise one compiled alternation).
+        Match offsets are mapped back to the string they fall in.
+        """
+        if not strings:
+            return []
+
+        joined = '\x00'.join(strings).lower()
+        offsets = []
+        offset = 0
         for string in strings:
-            for keyword in keywords:
-                if keyword in string.lower():
-                    found.append(string[:100])
+            offsets.append(offset)
+            offset += len(string) + 1
+
+        # Ordered dedupe, stopping at the 10 reported strings
+        found = {}
+        if _KEYWORD_AC is not None:
+            for end, _ in _KEYWORD_AC.iter(joined):
+                found[strings[bisect_right(offsets, end) - 1][:100]] = None
+                if len(found) >= 10:
+                    break
+        else:
+            pos = 0
+            while len(found) < 10:
+                match = _KEYWORD_RE.search(joined, pos)
+                if not match:
                     break
+                index = bisect_right(offsets, match.start()) - 1
+                found[strings[index][:100]] = None
+                # One hit flags the whole string; resume at the next one
+                if index + 1 >= len(offsets):
+                    break
+                pos = offsets[index + 1]
         
-        return list(set(found))[:10]
+        return list(found)
+
+    def _scan(self):
+        """
+        Run the scan table over the file content once
+
+        Later calls return the cached results, so each pattern is applied to
+        the file a single time however many analyses read it.
+
+        Returns:
+            List of matches per scan slot, as returned by findall (only the
+            first few for slots with a limit)
+        """
+        if self._scan_results is None:
+            self._load_content()
+            content = self._content
+            patterns = _ASCII_SCAN_PATTERNS if isinstance(content, bytes) else _SCAN_PATTERNS
+            results = []
+            for pattern, limit in zip(patterns, _SCAN_LIMITS):
+                if limit is None:
+                    results.append(pattern.findall(content))
+                else:
+                    # Threshold checks stop at the first few matches instead
+                    # of materializing every one
+                    results.append([match.group(0) for match in
+                                    itertools.islice(pattern.finditer(content), limit)])
+            self._scan_results = results
+        return self._scan_results
 
     def detect_commands(self):
         """Detect and categorize shell commands"""
         try:
-            with open(self.filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            commands = {
-                "network": ['curl', 'wget', 'nc', 'netcat', 'telnet', 'ssh', 'scp', 'ftp'],
-                "file_ops": ['rm', 'mv', 'cp', 'chmod', 'chown', 'dd', 'shred'],
-                "system": ['systemctl', 'service', 'crontab', 'kill', 'pkill'],
-                "package": ['apt', 'apt-get', 'yum', 'dnf', 'pip', 'npm'],
-                "process": ['ps', 'top', 'nohup', 'bg', 'fg', 'jobs'],
-                "user": ['useradd', 'usermod', 'passwd', 'su', 'sudo']
-            }
+            scan = self._scan()
             
             detected = {}
-            for category, cmds in commands.items():
+            for category, cmds in COMMANDS.items():
+                # Single scan per category instead of one per command; only
+                # the distinct matched names need decoding
+                counts = {_sample_text(match): count
+                          for match, count in Counter(scan[_CMD_SLOTS[category]]).items()}
+
                 found = []
                 for cmd in cmds:
-                    pattern = r'\b' + re.escape(cmd) + r'\b'
-                    matches = re.findall(pattern, content)
-                    if matches:
+                    count = counts.get(cmd, 0) + sum(counts.get(other, 0) for other in _IMPLIED_COMMANDS[cmd])
+                    if count:
                         found.append({
                             "command": cmd,
-                            "count": len(matches)
+                            "count": count
                         })
                 if found:
                     detected[category] = found
@@ -261,8 +628,7 @@ class ShellScriptAnalyzer:
     def analyze_threats(self):
         """Analyze for threat indicators with enhanced counting"""
         try:
-            with open(self.filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            scan = self._scan()
             
             threat_score = 0
             threats_found = []
@@ -271,8 +637,8 @@ class ShellScriptAnalyzer:
                 count_multiplier = config.get("count_multiplier", False)
                 threat_matches = []
                 
-                for pattern in config["patterns"]:
-                    matches = re.findall(pattern, content, re.IGNORECASE | re.MULTILINE)
+                for slot in _THREAT_SLOTS[threat_type]:
+                    matches = scan[slot]
                     if matches:
                         threat_matches.extend(matches)
                 
@@ -292,7 +658,7 @@ class ShellScriptAnalyzer:
                         "matches": len(threat_matches),
                         "weight": config["weight"],
                         "score_added": score_addition,
-                        "samples": [str(m)[:50] for m in threat_matches[:3]]  # Show first 3 samples
+                        "samples": [_sample_text(m)[:50] for m in threat_matches[:3]]  # Show first 3 samples
                     })
             
             self.results["threat_indicators"] = threats_found
@@ -305,27 +671,18 @@ class ShellScriptAnalyzer:
     def behavioral_analysis(self):
         """Analyze behavioral patterns with enhanced detection"""
         try:
-            with open(self.filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            self._load_content()
+            content = self._content
             
             # Count lines for repetition detection
-            lines = content.split('\n')
-            unique_lines = set(lines)
+            total_lines, unique_lines = _line_counts(content)
             
+            scan = self._scan()
             behaviors = {
-                "has_network_activity": bool(re.search(r'curl|wget|nc|telnet', content, re.I)),
-                "modifies_system_files": bool(re.search(r'/etc/|/usr/|/var/', content)),
-                "uses_encoding": bool(re.search(r'base64|xxd|openssl enc', content, re.I)),
-                "creates_persistence": bool(re.search(r'crontab|systemctl|\.bashrc|\.profile', content, re.I)),
-                "escalates_privileges": bool(re.search(r'sudo|su\s|chmod.*777', content, re.I)),
-                "hides_processes": bool(re.search(r'nohup|disown|&\s*$', content)),
-                "downloads_files": bool(re.search(r'curl.*-[Oo]|wget.*-O', content, re.I)),
-                "executes_remote_code": bool(re.search(r'(curl|wget).*\|.*(bash|sh)', content, re.I)),
-                "immediate_execution": bool(re.search(r'chmod.*\d{3}.*\./', content)),
-                "multi_architecture_targeting": len(re.findall(r'(x86_64|mips|arm|i[3-6]86)', content, re.I)) > 3,
-                "covers_tracks": bool(re.search(r'rm.*-rf.*\.\*|history.*-c', content, re.I)),
-                "has_repetitive_patterns": len(lines) > len(unique_lines) * 1.5
+                name: len(scan[_BEHAVIOR_SLOTS[name]]) >= needed
+                for name, (_, _, needed) in BEHAVIOR_PATTERNS.items()
             }
+            behaviors["has_repetitive_patterns"] = total_lines > unique_lines * 1.5
             
             risk_behaviors = sum(1 for v in behaviors.values() if v)
             
@@ -334,9 +691,9 @@ class ShellScriptAnalyzer:
                 "risk_behavior_count": risk_behaviors,
                 "total_behaviors_checked": len(behaviors),
                 "code_metrics": {
-                    "total_lines": len(lines),
-                    "unique_lines": len(unique_lines),
-                    "repetition_ratio": round(len(lines) / max(len(unique_lines), 1), 2)
+                    "total_lines": total_lines,
+                    "unique_lines": unique_lines,
+                    "repetition_ratio": round(total_lines / max(unique_lines, 1), 2)
                 }
             }
             
@@ -386,9 +743,18 @@ class ShellScriptAnalyzer:
         else:
             return f"This file appears relatively safe (Score: {score:.1f}%). However, always exercise caution with unknown scripts."
 
-    def analyze(self):
-        """Run complete analysis pipeline"""
+    def analyze(self, force_full=False):
+        """
+        Run complete analysis pipeline
+
+        String extraction does not feed the risk score, so it is skipped once
+        the threat score alone guarantees a Malicious verdict.
+
+        Args:
+            force_full: Always run every stage (e.g. for forensic re-runs)
+        """
         print(f"[*] Starting analysis of: {self.filename}")
+        self.results["timestamp"] = datetime.now(timezone.utc).isoformat()
         
         self.extract_metadata()
         print("[+] Metadata extracted")
@@ -396,15 +762,28 @@ class ShellScriptAnalyzer:
         self.generate_hashes()
         print("[+] Hashes generated")
         
-        self.analyze_strings()
-        print("[+] Strings analyzed")
-        
         self.detect_commands()
         print("[+] Commands detected")
         
         threat_score = self.analyze_threats()
         print(f"[+] Threat analysis complete (Score: {threat_score})")
         
+        if threat_score >= CONCLUSIVE_THREAT_SCORE and not force_full:
+            # Same shape as a real result so consumers need no special case
+            self.results["strings_analysis"] = {
+                "total_strings": 0,
+                "urls_found": [],
+                "ip_addresses": [],
+                "domains": [],
+                "emails": [],
+                "suspicious_keywords": [],
+                "skipped": "early_malicious_exit"
+            }
+            print("[+] Strings analysis skipped (threat score already conclusive)")
+        else:
+            self.analyze_strings()
+            print("[+] Strings analyzed")
+        
         self.behavioral_analysis()
         print("[+] Behavioral analysis complete")
         
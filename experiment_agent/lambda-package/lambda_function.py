@@ -4,17 +4,95 @@ Triggered by backend API, processes files from S3, uploads results to S3
 """
 
 import json
+import hashlib
 import boto3
-import os
+from botocore.exceptions import ClientError
 from datetime import datetime, timezone
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Import the Lambda-compatible analyzer
-from lambda_analyzer import ShellScriptAnalyzer
+from lambda_analyzer import ANALYZER_VERSION, ShellScriptAnalyzer
 
 # Initialize AWS clients
 s3_client = boto3.client('s3')
 
 
+def _serialize_results(results):
+    """Compact JSON for the results object (machine-read, so no indentation)"""
+    if orjson is not None:
+        return orjson.dumps(results, default=str)
+    return json.dumps(results, separators=(',', ':'), default=str)
+
+
+def _result_metadata(file_id, file_name, summary):
+    """S3 user metadata stored with a results object (values must be strings)"""
+    return {
+        'fileId': file_id,
+        'originalFilename': file_name,
+        'riskScore': str(summary['riskScore']),
+        'category': summary['category'],
+        'severity': summary['severity'],
+        'threatIndicators': str(summary['threatIndicators']),
+        'analysisTimestamp': summary['analysisTimestamp']
+    }
+
+
+# Result fields describing one upload rather than its content; they are left
+# out of the shared by-hash result and rebuilt for every request
+PER_UPLOAD_FIELDS = ('metadata', 'lambda_metadata', 'timestamp')
+
+
+def _by_hash_key(file_bytes):
+    """Key of the shared result for this content under the current analyzer"""
+    return f"by-hash/{ANALYZER_VERSION}/{hashlib.sha256(file_bytes).hexdigest()}.json"
+
+
+def _shared_results(results):
+    """Content-derived part of a result, safe to reuse for any upload of the same bytes"""
+    return {k: v for k, v in results.items() if k not in PER_UPLOAD_FIELDS}
+
+
+def _failed_stages(results):
+    """Result sections whose analysis stage recorded an error instead of findings"""
+    failed = []
+    for name, section in results.items():
+        entries = section if isinstance(section, list) else [section]
+        if any(isinstance(entry, dict) and 'error' in entry for entry in entries):
+            failed.append(name)
+    return failed
+
+
+def _cached_results(bucket, key):
+    """
+    Shared result previously stored for identical content
+
+    Returns:
+        dict of content-derived result fields, or None if there is no usable result
+    """
+    try:
+        stored = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code not in ('404', 'NoSuchKey', 'NotFound'):
+            print(f"[Lambda] Result cache lookup failed ({code}), running full analysis")
+        return None
+    
+    try:
+        shared = json.loads(stored['Body'].read())
+    except ValueError:
+        return None
+    if not isinstance(shared, dict) or 'risk_score_percentage' not in shared.get('risk_assessment', {}):
+        return None
+    if _failed_stages(shared):
+        # Never reuse a result from a run where a stage failed
+        return None
+    return shared
+
+
 def lambda_handler(event, context):
     """
     Lambda handler for SANDIA static analysis
@@ -27,8 +105,12 @@ def lambda_handler(event, context):
         "fileName": "malware.sh",
         "analysisType": "static",
         "resultsBucket": "sandia-analysis-results",
-        "timestamp": "2025-09-30T05:00:00Z"
+        "timestamp": "2025-09-30T05:00:00Z",
+        "forceFull": false
     }
+    
+    forceFull (optional) runs every analysis stage and ignores any stored
+    result for identical content, e.g. for forensic re-runs.
     """
     
     try:
@@ -40,6 +122,7 @@ def lambda_handler(event, context):
         s3_key = event.get('s3Key')
         file_name = event.get('fileName')
         results_bucket = event.get('resultsBucket', 'sandia-analysis-results')
+        force_full = bool(event.get('forceFull', False))
         
         # Validate required parameters
         if not all([file_id, source_bucket, s3_key, file_name]):
@@ -48,18 +131,36 @@ def lambda_handler(event, context):
         print(f"[Lambda] Processing file: {file_name} (ID: {file_id})")
         print(f"[Lambda] Source: s3://{source_bucket}/{s3_key}")
         
-        # Step 1: Download file from S3 to /tmp
-        local_path = f"/tmp/{file_name}"
-        print(f"[Lambda] Downloading file to {local_path}...")
+        # Step 1: Read the object straight into memory (no /tmp round trip)
+        print("[Lambda] Downloading file...")
+        s3_object = s3_client.get_object(Bucket=source_bucket, Key=s3_key)
+        file_bytes = s3_object['Body'].read()
+        print(f"[Lambda] Download complete. File size: {len(file_bytes)} bytes")
         
-        s3_client.download_file(source_bucket, s3_key, local_path)
-        print(f"[Lambda] Download complete. File size: {os.path.getsize(local_path)} bytes")
+        analyzer = ShellScriptAnalyzer.from_bytes(
+            file_name,
+            file_bytes,
+            source=f"s3://{source_bucket}/{s3_key}",
+            modified=s3_object.get('LastModified')
+        )
+        
+        # Step 2: Reuse the stored analysis if identical content was analyzed before
+        results_key = f"{file_id}.json"
+        by_hash_key = _by_hash_key(file_bytes)
+        shared = None if force_full else _cached_results(results_bucket, by_hash_key)
+        cached = shared is not None
         
-        # Step 2: Run static analysis
-        print("[Lambda] Starting static analysis...")
-        analyzer = ShellScriptAnalyzer(local_path)
-        results = analyzer.analyze()
-        print("[Lambda] Analysis complete!")
+        if cached:
+            print(f"[Lambda] Identical content already analyzed, reusing s3://{results_bucket}/{by_hash_key}")
+            # Content findings are shared; file metadata belongs to this upload
+            analyzer.extract_metadata()
+            results = {**analyzer.results, **shared}
+            results['timestamp'] = datetime.now(timezone.utc).isoformat()
+        else:
+            # Step 3: Run static analysis
+            print("[Lambda] Starting static analysis...")
+            results = analyzer.analyze(force_full=force_full)
+            print("[Lambda] Analysis complete!")
         
         # Add Lambda execution metadata
         results['lambda_metadata'] = {
@@ -69,29 +170,36 @@ def lambda_handler(event, context):
             'analysis_timestamp': datetime.now(timezone.utc).isoformat()
         }
         
-        # Step 3: Upload results to S3
-        results_key = f"{file_id}.json"
-        results_json = json.dumps(results, indent=2)
+        summary = {
+            'riskScore': results['risk_assessment']['risk_score_percentage'],
+            'category': results['risk_assessment']['category'],
+            'severity': results['risk_assessment']['severity'],
+            'threatIndicators': results['risk_assessment']['threat_indicators_found'],
+            'analysisTimestamp': results['timestamp']
+        }
         
+        # Step 4: Upload results to S3, plus the shared by-hash result for later duplicates
         print(f"[Lambda] Uploading results to s3://{results_bucket}/{results_key}")
         s3_client.put_object(
             Bucket=results_bucket,
             Key=results_key,
-            Body=results_json,
+            Body=_serialize_results(results),
             ContentType='application/json',
-            Metadata={
-                'fileId': file_id,
-                'originalFilename': file_name,
-                'riskScore': str(results['risk_assessment']['risk_score_percentage']),
-                'category': results['risk_assessment']['category']
-            }
+            Metadata=_result_metadata(file_id, file_name, summary)
         )
+        shared = _shared_results(results)
+        failed = _failed_stages(shared)
+        if failed:
+            print(f"[Lambda] Not sharing result, failed stages: {', '.join(failed)}")
+        elif not cached:
+            s3_client.put_object(
+                Bucket=results_bucket,
+                Key=by_hash_key,
+                Body=_serialize_results(shared),
+                ContentType='application/json'
+            )
         print("[Lambda] Results uploaded successfully!")
         
-        # Step 4: Cleanup temporary file
-        os.remove(local_path)
-        print("[Lambda] Temporary file cleaned up")
-        
         # Step 5: Return success response
         response = {
             'statusCode': 200,
@@ -102,15 +210,16 @@ def lambda_handler(event, context):
                 'fileName': file_name,
                 'resultsKey': results_key,
                 'resultsBucket': results_bucket,
-                'riskScore': results['risk_assessment']['risk_score_percentage'],
-                'category': results['risk_assessment']['category'],
-                'severity': results['risk_assessment']['severity'],
-                'threatIndicators': results['risk_assessment']['threat_indicators_found'],
-                'analysisTimestamp': results['timestamp']
+                'riskScore': summary['riskScore'],
+                'category': summary['category'],
+                'severity': summary['severity'],
+                'threatIndicators': summary['threatIndicators'],
+                'analysisTimestamp': summary['analysisTimestamp'],
+                'cached': cached
             })
         }
         
-        print(f"[Lambda] Execution successful. Risk Score: {results['risk_assessment']['risk_score_percentage']}%")
+        print(f"[Lambda] Execution successful. Risk Score: {summary['riskScore']}%")
         return response
         
     except Exception as e:
